@@ -2,13 +2,18 @@
 FastAPI Application - Biometric Data Normalization Service
 Receives biometric features → Normalizes with padding → Sends to ML service via HTTPS/TLS
 """
-from fastapi import FastAPI, Request, status
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import logging
 
 from .config import get_settings, validate_config
 from .routes import router
+from .cloud_service import close_ml_client
+from .middleware import GuardMiddleware
+from .rate_limiter import get_rate_limiter, purge_idle_identifiers_periodically
 
 # Configure logging
 logging.basicConfig(
@@ -26,13 +31,39 @@ except Exception as e:
 # Get settings
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Startup/shutdown hooks - runs the rate limiter cleanup task and releases
+    the pooled ML service connections on exit
+    """
+    limiter = get_rate_limiter(max_requests=settings.RATE_LIMIT_REQUESTS)
+    cleanup_task = asyncio.create_task(purge_idle_identifiers_periodically(limiter))
+    try:
+        yield
+    finally:
+        cleanup_task.cancel()
+        try:
+            await cleanup_task
+        except asyncio.CancelledError:
+            pass
+        await close_ml_client()
+
+
 # Create FastAPI application
 app = FastAPI(
     title="Biometric Normalization API",
     version="1.0.0",
     description="Normalize biometric stroke data and forward to ML service via HTTPS/TLS",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# Request size limit + rate limiting (protection against payload attacks / abuse).
+# Registered before CORS so rejections still carry CORS headers.
+app.add_middleware(GuardMiddleware)
+
 # Add CORS middleware for flexibility
 app.add_middleware(
     CORSMiddleware,
@@ -43,27 +74,6 @@ app.add_middleware(
 )
 
 
-# Middleware to limit request body size (protection against payload attacks)
-@app.middleware("http")
-async def limit_request_size(request: Request, call_next):
-    """Limit request body size to prevent DoS attacks"""
-    if request.method in ["POST", "PUT", "PATCH"]:
-        content_length = request.headers.get("content-length")
-        if content_length:
-            content_length = int(content_length)
-            if content_length > settings.MAX_REQUEST_SIZE:
-                return JSONResponse(
-                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                    content={
-                        "status": "error",
-                        "message": f"Request body too large: {content_length} bytes (max: {settings.MAX_REQUEST_SIZE} bytes)"
-                    }
-                )
-    
-    response = await call_next(request)
-    return response
-
-
 # Include routes
 app.include_router(router)
 
@@ -1,17 +1,87 @@
 """
 Cloud Service Communication - Send biometric data to ML service via TLS/HTTPS
 """
+import ssl
+import time
+import asyncio
+import base64
+import hashlib
+import struct
+import httpx
+import numpy as np
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Dict, Any, List
 from fastapi import HTTPException, status
 from .config import get_settings
 from .security import create_basic_auth_header
-from .models import StrokePoint, EnrollmentSignatureRequest
+from .models import Stroke, EnrollmentSignatureRequest
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Credentials for the ML service are fixed for the process lifetime, so the
+# Basic header is encoded once instead of on every outbound request.
+_default_headers = {
+    "Authorization": create_basic_auth_header(
+        settings.CLOUD_PROVIDER_USERNAME,
+        settings.CLOUD_PROVIDER_PASSWORD
+    ),
+    "Content-Type": "application/json",
+}
+
+# Pooled keep-alive session for the synchronous cloud calls (enrollment),
+# avoiding a fresh TCP + TLS handshake per request. Only connection errors are
+# retried: /auth/enroll is a non-idempotent POST, so a request that may have
+# reached the server (read errors, 5xx responses) is never sent twice.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(total=2, read=0, backoff_factor=0.1),
+)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+
+# Shared async client for the ML service: keeps a warm connection pool so
+# concurrent /normalize requests don't serialize behind one blocking call.
+# With HTTP/2 (negotiated via ALPN on https endpoints) requests multiplex over
+# one TLS connection; plain http or h1-only servers keep using HTTP/1.1.
+_ml_client = httpx.AsyncClient(
+    http2=settings.CLOUD_PROVIDER_HTTP2,
+    verify=settings.CLOUD_PROVIDER_VERIFY_SSL,
+    timeout=settings.CLOUD_PROVIDER_TIMEOUT,
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+)
+
+
+# TTL + LRU cache of ML responses keyed by a hash of the quantized stroke and
+# its features, so client retries skip the HTTPS round-trip and inference.
+# Only used when ML_CACHE_ENABLED is set (which also enables request coalescing).
+_ml_cache: "OrderedDict[bytes, tuple[float, Dict[str, Any]]]" = OrderedDict()
+# In-flight ML calls by the same key: concurrent duplicates share one request
+_ml_inflight: Dict[bytes, asyncio.Future] = {}
+
+
+async def close_ml_client() -> None:
+    """Close the shared ML service client (called on application shutdown)"""
+    await _ml_client.aclose()
+
+
+def _is_tls_error(error: BaseException) -> bool:
+    """httpx wraps SSL failures in ConnectError; walk the cause chain to find them"""
+    current: BaseException | None = error
+    while current is not None:
+        if isinstance(current, ssl.SSLError):
+            return True
+        current = current.__cause__ or current.__context__
+    return False
+
 def send_enrollment_to_ml_service(
     signatures: List[Dict[str, Any]],
     representation_strategy: str = "dtw_medoid",
@@ -31,18 +101,14 @@ def send_enrollment_to_ml_service(
             "representation_strategy": representation_strategy,
         }
         
-        auth_header = authorization or create_basic_auth_header(
-            settings.CLOUD_PROVIDER_USERNAME,
-            settings.CLOUD_PROVIDER_PASSWORD
-        )
+        headers = _default_headers
+        if authorization:
+            headers = {**_default_headers, "Authorization": authorization}
         
-        response = requests.post(
+        response = _session.post(
             f"{settings.CLOUD_SERVICE_URL}/auth/enroll",
-            json=payload,
-            headers={
-                "Authorization": auth_header,
-                "Content-Type": "application/json",
-            },
+            data=orjson.dumps(payload),
+            headers=headers,
             timeout=settings.CLOUD_PROVIDER_TIMEOUT,
             verify=settings.CLOUD_PROVIDER_VERIFY_SSL,
         )
@@ -62,36 +128,175 @@ def send_enrollment_to_ml_service(
         logger.error(f"Unexpected Cloud service error: {str(e)}")
         raise HTTPException(status_code=502, detail=str(e))
         
-def send_to_ml_service(normalized_points: List[StrokePoint], features: Dict[str, Any]) -> Dict[str, Any]:
+@lru_cache(maxsize=8)
+def _pack_buffer(n: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Reusable 9*n-byte wire buffer for strokes of n points, with typed views over
+    its x/y/t/p sections and a float64 scratch column. Padding snaps strokes to
+    a couple of fixed lengths, so only a few of these ever exist.
+    """
+    buffer = np.empty(9 * n, dtype=np.uint8)
+    return (
+        buffer,
+        buffer[:2 * n].view("<i2"),
+        buffer[2 * n:4 * n].view("<i2"),
+        buffer[4 * n:8 * n].view("<i4"),
+        buffer[8 * n:],
+        np.empty(n, dtype=np.float64),
+    )
 
-    try:
-        # Extract real_length from features - cloud_service expects it as separate field at root level
-        real_length = features.get("real_length")
-        
-        payload = {
-            "normalized_stroke": [
-                {"x": p.x, "y": p.y, "t": p.t, "p": p.p} for p in normalized_points
-            ],
+
+def _pack_stroke(stroke: Stroke) -> tuple[memoryview, float]:
+    """
+    Quantize a stroke into one little-endian buffer: x[n] int16, y[n] int16,
+    t[n] int32, p[n] uint8.
+
+    x/y share a fixed-point scale (value = int16 / xy_scale) chosen so the
+    largest |coordinate| maps to 32767, which keeps sub-pixel precision for raw
+    screen coordinates and ~3e-5 resolution for repo_compat's [0, 1] range.
+
+    The returned view points into a per-length buffer that the next call
+    overwrites: consume it (base64 / hash) before awaiting anything.
+    """
+    buffer, xs, ys, ts, ps, scratch = _pack_buffer(len(stroke))
+
+    max_abs = float(max(np.abs(stroke.x).max(initial=0.0), np.abs(stroke.y).max(initial=0.0)))
+    xy_scale = 32767.0 / max_abs if max_abs > 0 else 1.0
+
+    np.multiply(stroke.x, xy_scale, out=scratch)
+    xs[...] = np.rint(scratch, out=scratch)
+    np.multiply(stroke.y, xy_scale, out=scratch)
+    ys[...] = np.rint(scratch, out=scratch)
+    ts[...] = stroke.t
+    np.clip(stroke.p, 0.0, 1.0, out=scratch)
+    scratch *= 255
+    ps[...] = np.rint(scratch, out=scratch)
+    return memoryview(buffer), xy_scale
+
+
+def _build_ml_payload(stroke: Stroke, features: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the /validate body in the wire format selected by ML_PAYLOAD_FORMAT"""
+    # cloud_service expects real_length as a separate field at root level
+    real_length = features.get("real_length")
+
+    if settings.ML_PAYLOAD_FORMAT == "packed":
+        buffer, xy_scale = _pack_stroke(stroke)
+        return {
+            "stroke_b64": base64.b64encode(buffer).decode("ascii"),
+            "n": len(stroke),
+            "xy_scale": xy_scale,
             "real_length": real_length,
             "features": features,
         }
-        
 
-        auth_header = create_basic_auth_header(
-            settings.CLOUD_PROVIDER_USERNAME,
-            settings.CLOUD_PROVIDER_PASSWORD
-        )
+    if settings.ML_PAYLOAD_FORMAT == "columns":
+        # Arrays go straight to orjson (OPT_SERIALIZE_NUMPY): no per-point dicts
+        return {
+            "stroke_columns": {
+                "x": np.ascontiguousarray(stroke.x),
+                "y": np.ascontiguousarray(stroke.y),
+                "t": np.ascontiguousarray(stroke.t),
+                "p": np.ascontiguousarray(stroke.p),
+            },
+            "real_length": real_length,
+            "features": features,
+        }
+
+    return {
+        "normalized_stroke": stroke.to_point_dicts(),
+        "real_length": real_length,
+        "features": features,
+    }
+
+
+def _ml_cache_key(stroke: Stroke, features: Dict[str, Any]) -> bytes:
+    """BLAKE2b of the packed stroke buffer + features (near-identical retries collide on purpose)"""
+    buffer, xy_scale = _pack_stroke(stroke)
+    digest = hashlib.blake2b(buffer, digest_size=16)
+    # The buffer is scale-normalized: without xy_scale a uniformly scaled copy
+    # of the stroke would hash the same, and the ML verdict depends on absolute coordinates
+    digest.update(struct.pack("<d", xy_scale))
+    digest.update(orjson.dumps(features, option=orjson.OPT_SORT_KEYS))
+    return digest.digest()
+
+
+def _ml_cache_get(key: bytes) -> Dict[str, Any] | None:
+    entry = _ml_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, ml_response = entry
+    if expires_at <= time.monotonic():
+        del _ml_cache[key]
+        return None
+    _ml_cache.move_to_end(key)
+    return ml_response
+
+
+def _ml_cache_put(key: bytes, ml_response: Dict[str, Any]) -> None:
+    now = time.monotonic()
+    _ml_cache[key] = (now + settings.ML_CACHE_TTL_SECONDS, ml_response)
+    _ml_cache.move_to_end(key)
+
+    # Entries share one TTL, so insertion order is expiry order up to LRU touches
+    while _ml_cache:
+        oldest_key, (expires_at, _) = next(iter(_ml_cache.items()))
+        if expires_at > now and len(_ml_cache) <= settings.ML_CACHE_MAX_ENTRIES:
+            break
+        del _ml_cache[oldest_key]
+
+
+async def send_to_ml_service(normalized_stroke: Stroke, features: Dict[str, Any]) -> Dict[str, Any]:
+
+    if not settings.ML_CACHE_ENABLED:
+        return await _request_ml_service(normalized_stroke, features)
+
+    cache_key = _ml_cache_key(normalized_stroke, features)
+    cached = _ml_cache_get(cache_key)
+    if cached is not None:
+        logger.info("ML Service response served from cache")
+        return cached
+
+    # Singleflight: concurrent identical requests await the call already in flight
+    inflight = _ml_inflight.get(cache_key)
+    if inflight is not None:
+        logger.info("Joining in-flight ML Service request")
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+            # The leading request was cancelled (client went away): call the service ourselves
+            return await _request_ml_service(normalized_stroke, features)
+
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    _ml_inflight[cache_key] = future
+    try:
+        ml_response = await _request_ml_service(normalized_stroke, features)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        future.exception()  # mark as retrieved: there may be no joiners
+        raise
+    else:
+        future.set_result(ml_response)
+        _ml_cache_put(cache_key, ml_response)
+        return ml_response
+    finally:
+        _ml_inflight.pop(cache_key, None)
+
+
+async def _request_ml_service(normalized_stroke: Stroke, features: Dict[str, Any]) -> Dict[str, Any]:
+    """POST the stroke to the ML service /validate endpoint, mapping failures to HTTPException"""
+    try:
+        payload = _build_ml_payload(normalized_stroke, features)
         
 
-        response = requests.post(
+        response = await _ml_client.post(
             f"{settings.CLOUD_PROVIDER_ENDPOINT}/validate",
-            json=payload,
-            headers={
-                "Authorization": auth_header,
-                "Content-Type": "application/json",
-            },
-            timeout=settings.CLOUD_PROVIDER_TIMEOUT,
-            verify=settings.CLOUD_PROVIDER_VERIFY_SSL, 
+            content=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY),
+            headers=_default_headers,
         )
         
 
@@ -104,23 +309,25 @@ def send_to_ml_service(normalized_points: List[StrokePoint], features: Dict[str,
         
 
         ml_response = response.json()
-        logger.info(f"ML Service response: {ml_response}")
+        logger.debug("ML Service response: %s", ml_response)
         
         return ml_response
         
-    except requests.exceptions.Timeout:
+    except HTTPException:
+        raise
+    except httpx.TimeoutException:
         logger.error(f"ML Service timeout (>{settings.CLOUD_PROVIDER_TIMEOUT}s)")
         raise HTTPException(
             status_code=status.HTTP_504_GATEWAY_TIMEOUT,
             detail="ML Service timeout"
         )
-    except requests.exceptions.SSLError as e:
-        logger.error(f"TLS/SSL error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="TLS/SSL error with ML service"
-        )
-    except requests.exceptions.ConnectionError as e:
+    except httpx.ConnectError as e:
+        if _is_tls_error(e):
+            logger.error(f"TLS/SSL error: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="TLS/SSL error with ML service"
+            )
         logger.error(f"Connection error: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -3,6 +3,8 @@ Configuration Module - Load from .env file
 Centralized configuration for biometric normalization service
 """
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -17,68 +19,125 @@ def _required_env(name: str) -> str:
     return value.strip()
 
 
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+@dataclass(frozen=True, slots=True)
 class Settings:
-    """Application Settings - All configurable via environment variables"""
+    """
+    Application Settings - All configurable via environment variables
+
+    Inmutable y con __slots__: se construye una sola vez con from_env() y cada
+    lectura en el hot path es un acceso a slot, no un lookup en __dict__.
+    """
 
     # ========== API SERVER ==========
-    API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT: int = int(os.getenv("PORT", os.getenv("API_PORT", "8000")))
-    ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
-    DEBUG: bool = ENVIRONMENT == "development"
+    API_HOST: str
+    API_PORT: int
+    ENVIRONMENT: str
+    DEBUG: bool
+    # Procesos uvicorn fuera de desarrollo (main.py); por defecto uno por CPU
+    API_WORKERS: int
 
     # ========== JWT TOKEN VALIDATION ==========
-    JWT_PUBLIC_KEY_PATH: str = os.getenv("JWT_PUBLIC_KEY_PATH", "./keys/jwt_public.pem")
-    JWT_ISSUER: str = os.getenv("JWT_ISSUER", "LocalAzure")
-    JWT_AUDIENCE: str = os.getenv("JWT_AUDIENCE", "bmfa-processor")
-    JWT_ALGORITHM: str = "RS256"
+    JWT_PUBLIC_KEY_PATH: str
+    JWT_ISSUER: str
+    JWT_AUDIENCE: str
+    JWT_ALGORITHM: str
 
     # ========== SIGNATURE VALIDATION ==========
-    SIGNATURE_PROVIDER_USERNAME: str = os.getenv("SIGNATURE_PROVIDER_USERNAME", "bmfa_validator")
-    SIGNATURE_PROVIDER_PASSWORD: str = os.getenv("SIGNATURE_PROVIDER_PASSWORD", "secure_password_change_me")
+    SIGNATURE_PROVIDER_USERNAME: str
+    SIGNATURE_PROVIDER_PASSWORD: str
 
     # ========== CLOUD ML SERVICE (TLS/HTTPS) ==========
-    CLOUD_PROVIDER_ENDPOINT: str = _required_env("CLOUD_PROVIDER_ENDPOINT")
-    CLOUD_PROVIDER_USERNAME: str = _required_env("CLOUD_PROVIDER_USERNAME")
-    CLOUD_PROVIDER_PASSWORD: str = _required_env("CLOUD_PROVIDER_PASSWORD")
-    CLOUD_PROVIDER_TIMEOUT: int = int(os.getenv("CLOUD_PROVIDER_TIMEOUT", "30"))
-    CLOUD_PROVIDER_VERIFY_SSL: bool = os.getenv("CLOUD_PROVIDER_VERIFY_SSL", "true").lower() == "true"
+    CLOUD_PROVIDER_ENDPOINT: str
+    CLOUD_PROVIDER_USERNAME: str
+    CLOUD_PROVIDER_PASSWORD: str
+    CLOUD_PROVIDER_TIMEOUT: int
+    CLOUD_PROVIDER_VERIFY_SSL: bool
+    CLOUD_PROVIDER_HTTP2: bool
+    # "points": lista JSON de {x, y, t, p} | "columns": {x: [...], y: [...], t: [...], p: [...]}
+    # | "packed": buffer int16/int32/uint8 en base64
+    ML_PAYLOAD_FORMAT: str
+    ML_CACHE_ENABLED: bool
+    ML_CACHE_TTL_SECONDS: float
+    ML_CACHE_MAX_ENTRIES: int
 
     # ========== CLOUD SERVICE (SDK INTEGRATION) ==========
-    CLOUD_SERVICE_URL: str = _required_env("CLOUD_SERVICE_URL")
-    SDK_API_KEY: str = _required_env("SDK_API_KEY")
-    SDK_SECRET: str = _required_env("SDK_SECRET")
+    CLOUD_SERVICE_URL: str
+    SDK_API_KEY: str
+    SDK_SECRET: str
 
     # ========== GOOGLE OAUTH ==========
-    GOOGLE_REDIRECT_URI: str = _required_env("GOOGLE_REDIRECT_URI")
+    GOOGLE_REDIRECT_URI: str
 
     # ========== PUBLIC GATEWAY STEP-UP ==========
-    PUBLIC_GATEWAY_STEP_UP_ENDPOINT: str = _required_env("PUBLIC_GATEWAY_STEP_UP_ENDPOINT")
-    PUBLIC_GATEWAY_TIMEOUT: int = int(os.getenv("PUBLIC_GATEWAY_TIMEOUT", "30"))
+    PUBLIC_GATEWAY_STEP_UP_ENDPOINT: str
+    PUBLIC_GATEWAY_TIMEOUT: int
 
     # ========== BIOMETRIC NORMALIZATION ==========
-    MIN_STROKE_POINTS: int = int(os.getenv("MIN_STROKE_POINTS", "100"))
-    MAX_STROKE_POINTS: int = int(os.getenv("MAX_STROKE_POINTS", "1200"))
-    PADDING_STRATEGY: str = os.getenv("PADDING_STRATEGY", "linear_interpolation")
-    NORMALIZATION_PROFILE: str = os.getenv("NORMALIZATION_PROFILE", "repo_compat")
+    MIN_STROKE_POINTS: int
+    MAX_STROKE_POINTS: int
+    PADDING_STRATEGY: str
+    NORMALIZATION_PROFILE: str
+    # false: no se calculan features en la API (el servicio ML las deriva del trazo)
+    FEATURES_IN_API: bool
 
     # ========== RATE LIMITING & SECURITY ==========
-    RATE_LIMIT_REQUESTS: int = int(os.getenv("RATE_LIMIT_REQUESTS", "8"))
-    MAX_REQUEST_SIZE: int = int(os.getenv("MAX_REQUEST_SIZE", "102400"))  # 100 KB
+    RATE_LIMIT_REQUESTS: int
+    MAX_REQUEST_SIZE: int
 
     # ========== LOGGING ==========
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
-
-
-# Singleton instance
-_settings: Settings | None = None
-
-
+    LOG_LEVEL: str
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Read every setting from the environment (.env already loaded)"""
+        environment = os.getenv("ENVIRONMENT", "development")
+        return cls(
+            API_HOST=os.getenv("API_HOST", "0.0.0.0"),
+            API_PORT=int(os.getenv("PORT", os.getenv("API_PORT", "8000"))),
+            ENVIRONMENT=environment,
+            DEBUG=environment == "development",
+            API_WORKERS=int(os.getenv("API_WORKERS", str(os.cpu_count() or 1))),
+            JWT_PUBLIC_KEY_PATH=os.getenv("JWT_PUBLIC_KEY_PATH", "./keys/jwt_public.pem"),
+            JWT_ISSUER=os.getenv("JWT_ISSUER", "LocalAzure"),
+            JWT_AUDIENCE=os.getenv("JWT_AUDIENCE", "bmfa-processor"),
+            JWT_ALGORITHM="RS256",
+            SIGNATURE_PROVIDER_USERNAME=os.getenv("SIGNATURE_PROVIDER_USERNAME", "bmfa_validator"),
+            SIGNATURE_PROVIDER_PASSWORD=os.getenv("SIGNATURE_PROVIDER_PASSWORD", "secure_password_change_me"),
+            CLOUD_PROVIDER_ENDPOINT=_required_env("CLOUD_PROVIDER_ENDPOINT"),
+            CLOUD_PROVIDER_USERNAME=_required_env("CLOUD_PROVIDER_USERNAME"),
+            CLOUD_PROVIDER_PASSWORD=_required_env("CLOUD_PROVIDER_PASSWORD"),
+            CLOUD_PROVIDER_TIMEOUT=int(os.getenv("CLOUD_PROVIDER_TIMEOUT", "30")),
+            CLOUD_PROVIDER_VERIFY_SSL=_env_bool("CLOUD_PROVIDER_VERIFY_SSL", "true"),
+            CLOUD_PROVIDER_HTTP2=_env_bool("CLOUD_PROVIDER_HTTP2", "true"),
+            ML_PAYLOAD_FORMAT=os.getenv("ML_PAYLOAD_FORMAT", "points").strip().lower(),
+            ML_CACHE_ENABLED=_env_bool("ML_CACHE_ENABLED", "false"),
+            ML_CACHE_TTL_SECONDS=float(os.getenv("ML_CACHE_TTL_SECONDS", "60")),
+            ML_CACHE_MAX_ENTRIES=int(os.getenv("ML_CACHE_MAX_ENTRIES", "1024")),
+            CLOUD_SERVICE_URL=_required_env("CLOUD_SERVICE_URL"),
+            SDK_API_KEY=_required_env("SDK_API_KEY"),
+            SDK_SECRET=_required_env("SDK_SECRET"),
+            GOOGLE_REDIRECT_URI=_required_env("GOOGLE_REDIRECT_URI"),
+            PUBLIC_GATEWAY_STEP_UP_ENDPOINT=_required_env("PUBLIC_GATEWAY_STEP_UP_ENDPOINT"),
+            PUBLIC_GATEWAY_TIMEOUT=int(os.getenv("PUBLIC_GATEWAY_TIMEOUT", "30")),
+            MIN_STROKE_POINTS=int(os.getenv("MIN_STROKE_POINTS", "100")),
+            MAX_STROKE_POINTS=int(os.getenv("MAX_STROKE_POINTS", "1200")),
+            PADDING_STRATEGY=os.getenv("PADDING_STRATEGY", "linear_interpolation"),
+            NORMALIZATION_PROFILE=os.getenv("NORMALIZATION_PROFILE", "repo_compat"),
+            FEATURES_IN_API=_env_bool("FEATURES_IN_API", "true"),
+            RATE_LIMIT_REQUESTS=int(os.getenv("RATE_LIMIT_REQUESTS", "8")),
+            MAX_REQUEST_SIZE=int(os.getenv("MAX_REQUEST_SIZE", "102400")),  # 100 KB
+            LOG_LEVEL=os.getenv("LOG_LEVEL", "INFO"),
+        )
+
+
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
-    """Get application settings singleton"""
-    global _settings
-    if _settings is None:
-        _settings = Settings()
-    return _settings
+    """Get application settings singleton (read from the environment once)"""
+    return Settings.from_env()
 
 
 def validate_config() -> None:
@@ -0,0 +1,93 @@
+"""
+Guard Middleware - Request size limit + rate limiting as pure ASGI middleware
+
+Corre antes de que FastAPI lea el body o Pydantic lo valide: un request
+demasiado grande o fuera de límite se rechaza solo con los headers, sin el
+doble buffering de BaseHTTPMiddleware ni la resolución de dependencias.
+"""
+from fastapi import status
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .config import get_settings
+from .rate_limiter import get_rate_limiter
+
+settings = get_settings()
+
+# Endpoints con rate limiting (8 requests/minute por IP por defecto)
+RATE_LIMITED_PATHS = frozenset({
+    "/normalize",
+    "/enroll",
+    "/auth/step-up",
+    "/api/auth/step-up",
+})
+
+_BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+
+def _get_header(scope: Scope, name: bytes) -> bytes | None:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def get_client_identifier(scope: Scope) -> str:
+    """Client IP for rate limiting: first X-Forwarded-For hop (behind proxy) or peer address"""
+    forwarded = _get_header(scope, b"x-forwarded-for")
+    if forwarded:
+        return forwarded.decode("latin-1").split(",")[0].strip()
+
+    client = scope.get("client")
+    if client:
+        return client[0]
+
+    return "unknown"
+
+
+class GuardMiddleware:
+    """
+    Rechaza bodies mayores a MAX_REQUEST_SIZE (413, por Content-Length) y aplica
+    el rate limiter a RATE_LIMITED_PATHS (429) antes de llegar a la app
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.max_request_size = settings.MAX_REQUEST_SIZE
+        self.limiter = get_rate_limiter(max_requests=settings.RATE_LIMIT_REQUESTS)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in _BODY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = _get_header(scope, b"content-length")
+        if content_length:
+            try:
+                size = int(content_length)
+            except ValueError:
+                response = ORJSONResponse(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    content={"status": "error", "message": "Invalid Content-Length header"},
+                )
+                await response(scope, receive, send)
+                return
+            if size > self.max_request_size:
+                response = ORJSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={
+                        "status": "error",
+                        "message": f"Request body too large: {size} bytes (max: {self.max_request_size} bytes)"
+                    },
+                )
+                await response(scope, receive, send)
+                return
+
+        if scope["path"] in RATE_LIMITED_PATHS and not self.limiter.check_rate_limit(get_client_identifier(scope)):
+            response = ORJSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": f"Rate limit exceeded: max {settings.RATE_LIMIT_REQUESTS} requests per minute"},
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
@@ -8,9 +8,15 @@ Flujo:
 3. API envía a servicio en la nube con HTTPS/TLS
 4. Retorna resultado
 """
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from dataclasses import dataclass
+from pydantic import BaseModel, Field, PlainValidator, PlainSerializer, TypeAdapter
+from typing import Annotated, Any, Dict, List, Optional, Literal
 from datetime import datetime
+import numpy as np
+
+
+# t se guarda en int64: un valor >= 2**63 daría la vuelta a negativo al castear
+_T_LIMIT = 2 ** 63
 
 
 class StrokePoint(BaseModel):
@@ -20,7 +26,7 @@ class StrokePoint(BaseModel):
     """
     x: float = Field(..., description="Coordenada X del punto")
     y: float = Field(..., description="Coordenada Y del punto")
-    t: int = Field(..., ge=0, description="Tiempo relativo en ms desde inicio del trazo")
+    t: int = Field(..., ge=0, lt=_T_LIMIT, description="Tiempo relativo en ms desde inicio del trazo")
     p: float = Field(..., ge=0.0, le=1.0, description="Presión normalizada (0.0 a 1.0)")
 
     class Config:
@@ -34,13 +40,81 @@ class StrokePoint(BaseModel):
         }
 
 
+@dataclass(frozen=True, eq=False)
+class Stroke:
+    """
+    Trazo en layout columnar (struct-of-arrays): una columna NumPy por campo
+    x/y/p en float64 y t en int64 (ms), para que los valores que viajan en el
+    JSON sean exactamente los que envió el cliente
+    """
+    x: np.ndarray
+    y: np.ndarray
+    t: np.ndarray
+    p: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __getitem__(self, index: slice) -> "Stroke":
+        return Stroke(x=self.x[index], y=self.y[index], t=self.t[index], p=self.p[index])
+
+    def to_point_dicts(self) -> List[Dict[str, Any]]:
+        """Lista de {x, y, t, p} (formato de cable de Flutter y del servicio ML)"""
+        return [
+            {"x": x, "y": y, "t": t, "p": p}
+            for x, y, t, p in zip(self.x.tolist(), self.y.tolist(), self.t.tolist(), self.p.tolist())
+        ]
+
+
+_stroke_points_adapter = TypeAdapter(List[StrokePoint])
+
+
+def _parse_stroke(value: Any) -> Stroke:
+    """
+    Valida los puntos columna por columna en lugar de instanciar un StrokePoint
+    por punto. Si la vía rápida falla se delega en la validación de StrokePoint,
+    que produce los mismos errores 422 de siempre.
+    """
+    if isinstance(value, Stroke):
+        return value
+    try:
+        rows = [(pt["x"], pt["y"], pt["t"], pt["p"]) for pt in value]
+        columns = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        x, y, t, p = columns.T
+        if (
+            np.isfinite(columns).all()
+            and (t >= 0).all()
+            and (t < _T_LIMIT).all()
+            and (t == np.floor(t)).all()
+            and ((p >= 0.0) & (p <= 1.0)).all()
+        ):
+            return Stroke(x=x.copy(), y=y.copy(), t=t.astype(np.int64), p=p.copy())
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    points = _stroke_points_adapter.validate_python(value)
+    return Stroke(
+        x=np.array([pt.x for pt in points], dtype=np.float64),
+        y=np.array([pt.y for pt in points], dtype=np.float64),
+        t=np.array([pt.t for pt in points], dtype=np.int64),
+        p=np.array([pt.p for pt in points], dtype=np.float64),
+    )
+
+
+StrokeArray = Annotated[
+    Stroke,
+    PlainValidator(_parse_stroke, json_schema_input_type=List[StrokePoint]),
+    PlainSerializer(lambda stroke: stroke.to_point_dicts(), return_type=List[Dict[str, Any]]),
+]
+
+
 class NormalizationRequest(BaseModel):
     """
     Request que envía Flutter con los datos del trazo
     Enviado a: POST /normalize
     """
     timestamp: str = Field(..., description="ISO 8601 timestamp de captura")
-    stroke_points: List[StrokePoint] = Field(..., description="Puntos del trazo (mínimo 1)")
+    stroke_points: StrokeArray = Field(..., description="Puntos del trazo (mínimo 1)")
     stroke_duration_ms: int = Field(..., ge=0, description="Duración total en ms")
 
     class Config:
@@ -64,7 +138,7 @@ class NormalizationResponse(BaseModel):
     """
     status: str = Field(..., description="success | error")
     message: str = Field(..., description="Mensaje de estado")
-    normalized_stroke: List[StrokePoint] = Field(default=[], description="Puntos normalizados")
+    normalized_stroke: List[Dict[str, Any]] = Field(default=[], description="Puntos normalizados {x, y, t, p}")
     features: dict = Field(default={}, description="Features extraídas (velocidad, distancia, etc)")
     ml_response: dict = Field(default={}, description="Respuesta del servicio ML en la nube")
     error: str | None = None  # Optional error message
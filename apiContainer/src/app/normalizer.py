@@ -1,16 +1,25 @@
 """
 Biometric Data Normalizer - Padding and normalization logic
+
+Trabaja sobre Stroke (layout columnar x/y/t/p): cada paso lee y escribe arrays
+contiguos en lugar de listas de StrokePoint.
 """
-from typing import List, Tuple, Dict, Any
-import math
+from typing import Callable, Tuple, Dict, Any
 import numpy as np
-from .models import StrokePoint, NormalizationRequest
+from .models import Stroke, NormalizationRequest
 from .config import get_settings
 
 settings = get_settings()
 
+# Límites y perfil fijos para toda la vida del proceso: se leen una sola vez
+_MIN_POINTS = settings.MIN_STROKE_POINTS
+_MAX_POINTS = settings.MAX_STROKE_POINTS
+_REPO_COMPAT = settings.NORMALIZATION_PROFILE.lower() == "repo_compat"
+_REPO_COMPAT_TARGET = 400
+_FEATURES_IN_API = settings.FEATURES_IN_API
+
 
-def normalize_stroke(request: NormalizationRequest) -> Tuple[List[StrokePoint], Dict[str, Any]]:
+def normalize_stroke(request: NormalizationRequest) -> Tuple[Stroke, Dict[str, Any]]:
     """
     Normalize stroke points by applying padding if necessary
     
@@ -18,53 +27,47 @@ def normalize_stroke(request: NormalizationRequest) -> Tuple[List[StrokePoint],
         request: NormalizationRequest with stroke data
         
     Returns:
-        tuple: (normalized_points, features_dict)
+        tuple: (normalized_stroke, features_dict)
     """
-    points = request.stroke_points
-    num_points = len(points)
+    stroke = request.stroke_points
+    num_points = len(stroke)
     real_length = num_points  # Capturar longitud original antes del padding
     
     # Validar límites antes de procesar
-    if num_points < settings.MIN_STROKE_POINTS:
-        raise ValueError(f"Stroke too short: {num_points} points < minimum required {settings.MIN_STROKE_POINTS}")
-    elif num_points > settings.MAX_STROKE_POINTS:
-        raise ValueError(f"Too many points: {num_points} > {settings.MAX_STROKE_POINTS}")
-
-    if settings.NORMALIZATION_PROFILE.lower() == "repo_compat":
-        normalized = normalize_repo_compat(points, 400)
-        features = extract_features(normalized, request.stroke_duration_ms, real_length)
+    if num_points < _MIN_POINTS:
+        raise ValueError(f"Stroke too short: {num_points} points < minimum required {_MIN_POINTS}")
+    elif num_points > _MAX_POINTS:
+        raise ValueError(f"Too many points: {num_points} > {_MAX_POINTS}")
+
+    if _REPO_COMPAT:
+        scaled = _repo_compat_scale(stroke, _REPO_COMPAT_TARGET)
+        normalized, features = _pad_and_featurize(scaled, _REPO_COMPAT_TARGET, request.stroke_duration_ms, real_length)
         features["normalization_profile"] = "repo_compat"
-        features["target_length"] = 400
+        features["target_length"] = _REPO_COMPAT_TARGET
         features["representation_strategy"] = "dtw_medoid"
         return normalized, features
 
     # Padding a MAX_STROKE_POINTS para estandarizar transporte
     # Cloud service usa real_length para extraer solo datos reales
-    normalized = apply_padding(points, settings.MAX_STROKE_POINTS, "repeat_last")
-
-    features = extract_features(normalized, request.stroke_duration_ms, real_length)
+    return _pad_and_featurize(stroke, _MAX_POINTS, request.stroke_duration_ms, real_length)
 
-    return normalized, features
 
-
-def normalize_repo_compat(points: List[StrokePoint], target_count: int) -> List[StrokePoint]:
+def normalize_repo_compat(stroke: Stroke, target_count: int) -> Stroke:
     """
     Normalize a stroke to the repo-compatible format used by the external LSTM.
 
     Keeps the raw sequence structure and only rescales x/y robustly using percentiles.
     Time is preserved as relative milliseconds and pressure is left in [0, 1].
     """
-    if not points:
-        return []
+    if not len(stroke):
+        return stroke
+
+    return repeat_last_padding(_repo_compat_scale(stroke, target_count), target_count)
 
-    cropped = list(points[:target_count])
-    if len(cropped) > target_count:
-        cropped = cropped[:target_count]
 
-    xs = np.array([p.x for p in cropped], dtype=float)
-    ys = np.array([p.y for p in cropped], dtype=float)
-    ts = np.array([p.t for p in cropped], dtype=float)
-    ps = np.array([p.p for p in cropped], dtype=float)
+def _repo_compat_scale(stroke: Stroke, target_count: int) -> Stroke:
+    """Crop to target_count and apply the repo-compatible robust x/y scaling"""
+    cropped = stroke[:target_count]
 
     def _robust_scale(values: np.ndarray) -> np.ndarray:
         low = np.percentile(values, 10)
@@ -73,132 +76,164 @@ def normalize_repo_compat(points: List[StrokePoint], target_count: int) -> List[
             return np.zeros_like(values, dtype=float)
         return np.clip((values - low) / (high - low), 0.0, 1.0)
 
-    xs = _robust_scale(xs)
-    ys = _robust_scale(ys)
+    return Stroke(
+        x=_robust_scale(cropped.x),
+        y=_robust_scale(cropped.y),
+        t=cropped.t,
+        p=np.clip(cropped.p, 0.0, 1.0),
+    )
 
-    ps = np.clip(ps, 0.0, 1.0)
 
-    normalized = [
-        StrokePoint(x=float(x), y=float(y), t=int(t), p=float(p))
-        for x, y, t, p in zip(xs, ys, ts, ps)
-    ]
-
-    while len(normalized) < target_count:
-        last = normalized[-1]
-        normalized.append(StrokePoint(x=last.x, y=last.y, t=last.t + 1, p=last.p))
+def _pad_and_featurize(stroke: Stroke, target_count: int, duration_ms: int, real_length: int) -> Tuple[Stroke, Dict[str, Any]]:
+    """
+    Pad a stroke to target_count (repeat_last) and extract features in one pass
 
-    return normalized[:target_count]
+    The padded tail only repeats the last point, so it adds no distance and one
+    zero-velocity sample per padded point: features are computed over the real
+    columns and corrected for the tail instead of walking the padded stroke again.
+    """
+    padded = repeat_last_padding(stroke, target_count)
+    
+    if not _FEATURES_IN_API:
+        # El servicio ML calcula sus propias features: solo metadatos mínimos
+        return padded, {
+            "num_points": len(padded),
+            "real_length": real_length,
+            "duration_ms": duration_ms,
+        }
+    
+    padded_count = max(0, target_count - len(stroke)) if len(stroke) else 0
+    features = extract_features(stroke, duration_ms, real_length, padded_count)
+    return padded, features
 
 
-def apply_padding(points: List[StrokePoint], target_count: int, strategy: str = "linear_interpolation") -> List[StrokePoint]:
+def apply_padding(stroke: Stroke, target_count: int, strategy: str | None = None) -> Stroke:
     """
     Apply padding to stroke points if there are fewer than required
     
     Args:
-        points: Original stroke points
+        stroke: Original stroke
         target_count: Target number of points
         strategy: "linear_interpolation" or "repeat_last"
+            (default: PADDING_STRATEGY, resolved once at import)
         
     Returns:
-        List[StrokePoint]: Padded points
+        Stroke: Padded stroke
     """
-    if len(points) >= target_count:
-        return points
+    if len(stroke) >= target_count:
+        return stroke
     
-    if strategy == "linear_interpolation":
-        return linear_interpolation_padding(points, target_count)
-    elif strategy == "repeat_last":
-        return repeat_last_padding(points, target_count)
-    else:
-        raise ValueError(f"Unknown padding strategy: {strategy}")
+    pad_fn = _PAD_FN if strategy is None else _PAD_FNS.get(strategy)
+    if pad_fn is None:
+        raise ValueError(f"Unknown padding strategy: {strategy or settings.PADDING_STRATEGY}")
+    return pad_fn(stroke, target_count)
 
 
-def linear_interpolation_padding(points: List[StrokePoint], target_count: int) -> List[StrokePoint]:
+def linear_interpolation_padding(stroke: Stroke, target_count: int) -> Stroke:
+    """
+    Pad by inserting linearly interpolated points, spread evenly across segments
+    (the first `needed % segments` segments get one extra point)
+    """
+    current_count = len(stroke)
 
-    if len(points) == 1:
-        
-        return [StrokePoint(x=points[0].x, y=points[0].y, t=points[0].t, p=points[0].p) for _ in range(target_count)]
+    if current_count == 1:
+        return Stroke(
+            x=np.repeat(stroke.x, target_count),
+            y=np.repeat(stroke.y, target_count),
+            t=np.repeat(stroke.t, target_count),
+            p=np.repeat(stroke.p, target_count),
+        )
     
-    current_count = len(points)
     needed = target_count - current_count
     
     if needed <= 0:
-        return points[:target_count]
-    
-    
-    num_segments = len(points) - 1
-    points_per_segment = needed // num_segments
-    extra_points = needed % num_segments
-    
-    padded = []
-    for i in range(len(points) - 1):
-        padded.append(points[i])
-        
-        
-        num_to_insert = points_per_segment + (1 if i < extra_points else 0)
-        
-        if num_to_insert > 0:
-            p1 = points[i]
-            p2 = points[i + 1]
-            
-            for j in range(1, num_to_insert + 1):
-                t = j / (num_to_insert + 1)
-                x = p1.x + (p2.x - p1.x) * t
-                y = p1.y + (p2.y - p1.y) * t
-                time = int(p1.t + (p2.t - p1.t) * t)
-                pressure = p1.p + (p2.p - p1.p) * t
-                
-                padded.append(StrokePoint(x=x, y=y, t=time, p=pressure))
+        return stroke[:target_count]
     
-    padded.append(points[-1])
+    num_segments = current_count - 1
+    inserts = np.full(num_segments, needed // num_segments)
+    inserts[:needed % num_segments] += 1
     
+    # Cada segmento aporta su punto inicial + sus puntos interpolados (las
+    # primeras target_count - 1 posiciones); el último punto original cierra.
+    # Los índices y frac se calculan una vez y se reutilizan en las 4 columnas.
+    slots = inserts + 1
+    segment = np.repeat(np.arange(num_segments), slots)
+    next_segment = segment + 1
+    frac = np.arange(target_count - 1) - np.repeat(np.cumsum(slots) - slots, slots)
+    frac = frac / slots[segment]
     
-    while len(padded) < target_count:
-        last = padded[-1]
-        padded.append(StrokePoint(x=last.x, y=last.y, t=last.t + 1, p=last.p))
+    def _interpolate(values: np.ndarray) -> np.ndarray:
+        # Salida preasignada al tamaño final: start + (end - start) * frac en sitio
+        out = np.empty(target_count, dtype=np.float64)
+        body = out[:-1]
+        start = values[segment]
+        np.subtract(values[next_segment], start, out=body)
+        body *= frac
+        body += start
+        out[-1] = values[-1]
+        return out
     
-    return padded[:target_count]
+    return Stroke(
+        x=_interpolate(stroke.x),
+        y=_interpolate(stroke.y),
+        t=_interpolate(stroke.t).astype(np.int64),
+        p=_interpolate(stroke.p),
+    )
 
 
-def repeat_last_padding(points: List[StrokePoint], target_count: int) -> List[StrokePoint]:
+def repeat_last_padding(stroke: Stroke, target_count: int) -> Stroke:
     """
     Pad by repeating the last point (simple padding)
-    Creates new StrokePoint instances with incremented time
+    Repeated points get t incremented by 1 ms per step
     """
-    padded = list(points)
-    if not padded:
-        return []
+    missing = target_count - len(stroke)
+    if missing <= 0 or not len(stroke):
+        return stroke[:target_count]
+    
+    current_count = len(stroke)
     
-    last_point = padded[-1]
-    time_increment = 1
+    def _repeat_last(values: np.ndarray) -> np.ndarray:
+        out = np.empty(target_count, dtype=values.dtype)
+        out[:current_count] = values
+        out[current_count:] = values[-1]
+        return out
     
-    while len(padded) < target_count:
-        padded.append(StrokePoint(
-            x=last_point.x,
-            y=last_point.y,
-            t=last_point.t + time_increment,
-            p=last_point.p
-        ))
-        time_increment += 1
+    t = _repeat_last(stroke.t)
+    t[current_count:] += np.arange(1, missing + 1, dtype=t.dtype)
     
-    return padded[:target_count]
+    return Stroke(
+        x=_repeat_last(stroke.x),
+        y=_repeat_last(stroke.y),
+        t=t,
+        p=_repeat_last(stroke.p),
+    )
 
 
-def extract_features(points: List[StrokePoint], duration_ms: int, real_length: int) -> Dict[str, Any]:
+_PAD_FNS: Dict[str, Callable[[Stroke, int], Stroke]] = {
+    "linear_interpolation": linear_interpolation_padding,
+    "repeat_last": repeat_last_padding,
+}
+_PAD_FN = _PAD_FNS.get(settings.PADDING_STRATEGY)
+
+
+def extract_features(stroke: Stroke, duration_ms: int, real_length: int, padded_count: int = 0) -> Dict[str, Any]:
     """
     Extract biometric features from normalized stroke
     
     Args:
-        points: Normalized stroke points
+        stroke: Normalized stroke
         duration_ms: Total stroke duration in milliseconds
         real_length: Original number of points before padding
+        padded_count: Repeat-last points that follow the stroke; each one counts
+            as a point with a zero-velocity sample but adds no distance
         
     Returns:
         dict: Feature dictionary
     """
-    if not points or len(points) < 2:
+    num_points = len(stroke) + padded_count
+    if num_points < 2:
         return {
-            "num_points": len(points),
+            "num_points": num_points,
             "real_length": real_length,
             "total_distance": 0.0,
             "velocity_mean": 0.0,
@@ -206,31 +241,19 @@ def extract_features(points: List[StrokePoint], duration_ms: int, real_length: i
             "duration_ms": duration_ms,
         }
     
+    distances = np.hypot(np.diff(stroke.x), np.diff(stroke.y))
+    time_diff_s = np.diff(stroke.t) / 1000.0
+    moving = time_diff_s > 0
+    velocities = distances[moving] / time_diff_s[moving]
+    samples = velocities.size + padded_count
     
-    total_distance = 0.0
-    velocities = []
-    
-    for i in range(1, len(points)):
-        dx = points[i].x - points[i-1].x
-        dy = points[i].y - points[i-1].y
-        distance = math.sqrt(dx**2 + dy**2)
-        total_distance += distance
-        
-        
-        time_diff_ms = points[i].t - points[i-1].t
-        if time_diff_ms > 0:
-            time_diff_s = time_diff_ms / 1000.0
-            velocity = distance / time_diff_s
-            velocities.append(velocity)
-    
-    
-    velocity_mean = sum(velocities) / len(velocities) if velocities else 0.0
-    velocity_max = max(velocities) if velocities else 0.0
+    velocity_mean = float(velocities.sum()) / samples if samples else 0.0
+    velocity_max = float(velocities.max()) if velocities.size else 0.0
     
     return {
-        "num_points": len(points),
+        "num_points": num_points,
         "real_length": real_length,
-        "total_distance": round(total_distance, 2),
+        "total_distance": round(float(distances.sum()), 2),
         "velocity_mean": round(velocity_mean, 2),
         "velocity_max": round(velocity_max, 2),
         "duration_ms": duration_ms,
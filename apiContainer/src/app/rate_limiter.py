@@ -2,19 +2,31 @@
 Rate Limiter - Protect against abuse and DoS attacks
 Limits requests per user/IP to prevent overload
 """
-from fastapi import HTTPException, Request, status
-from typing import Dict
-from datetime import datetime, timedelta
-from collections import defaultdict
+from typing import Deque, Dict, List, Tuple
+from collections import deque
+import asyncio
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Potencia de 2: el shard se elige con hash(identifier) & (_NUM_SHARDS - 1)
+_NUM_SHARDS = 16
+
 
 class RateLimiter:
     """
     Simple in-memory rate limiter
     Tracks requests per identifier (IP or user) within time window
+
+    Each identifier keeps a deque of its last max_requests timestamps
+    (time.monotonic). The limit is hit when the deque is full and its oldest
+    entry is still inside the window; appending to a full deque evicts that
+    oldest entry, so no cleanup pass is needed.
+
+    Identifiers are spread over _NUM_SHARDS dicts, each guarded by its own
+    lock, so concurrent checks only contend when they land on the same shard.
     """
     
     def __init__(self, max_requests: int = 8, window_seconds: int = 60):
@@ -25,16 +37,13 @@ class RateLimiter:
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self.requests: Dict[str, list] = defaultdict(list)
-    
-    def _clean_old_requests(self, identifier: str, now: datetime) -> None:
-        """Remove requests older than the time window"""
-        cutoff = now - timedelta(seconds=self.window_seconds)
-        self.requests[identifier] = [
-            req_time for req_time in self.requests[identifier]
-            if req_time > cutoff
+        self._shards: List[Tuple[Dict[str, Deque[float]], threading.Lock]] = [
+            ({}, threading.Lock()) for _ in range(_NUM_SHARDS)
         ]
     
+    def _shard_for(self, identifier: str) -> Tuple[Dict[str, Deque[float]], threading.Lock]:
+        return self._shards[hash(identifier) & (_NUM_SHARDS - 1)]
+    
     def check_rate_limit(self, identifier: str) -> bool:
         """
         Check if identifier is within rate limit
@@ -45,46 +54,49 @@ class RateLimiter:
         Returns:
             bool: True if within limit, False if exceeded
         """
-        now = datetime.now()
-        
-        # Clean old requests
-        self._clean_old_requests(identifier, now)
+        shard, lock = self._shard_for(identifier)
         
-        # Check current count
-        current_count = len(self.requests[identifier])
-        
-        if current_count >= self.max_requests:
-            logger.warning(
-                f"Rate limit exceeded for {identifier}: "
-                f"{current_count}/{self.max_requests} requests in last {self.window_seconds}s"
+        with lock:
+            now = time.monotonic()
+            timestamps = shard.get(identifier)
+            if timestamps is None:
+                timestamps = shard[identifier] = deque(maxlen=self.max_requests)
+            
+            limited = len(timestamps) >= self.max_requests and (
+                not timestamps or now - timestamps[0] < self.window_seconds
             )
-            return False
+            if not limited:
+                # Add current request (evicts the oldest one once the deque is full)
+                timestamps.append(now)
+                return True
+            count = len(timestamps)
         
-        # Add current request
-        self.requests[identifier].append(now)
-        return True
+        logger.warning(
+            f"Rate limit exceeded for {identifier}: "
+            f"{count}/{self.max_requests} requests in last {self.window_seconds}s"
+        )
+        return False
     
-    def get_identifier(self, request: Request) -> str:
+    def purge_idle(self) -> int:
         """
-        Extract identifier from request
-        Uses client IP address as identifier
+        Drop identifiers whose most recent request is older than the window
+        (they can no longer be limited), so memory doesn't grow with IP churn
         
-        Args:
-            request: FastAPI Request object
-            
         Returns:
-            str: Identifier for rate limiting
+            int: Number of identifiers removed
         """
-        # Try to get real IP from headers (if behind proxy)
-        forwarded = request.headers.get("X-Forwarded-For")
-        if forwarded:
-            return forwarded.split(",")[0].strip()
-        
-        # Fall back to direct client IP
-        if request.client:
-            return request.client.host
-        
-        return "unknown"
+        removed = 0
+        for shard, lock in self._shards:
+            with lock:
+                now = time.monotonic()
+                idle = [
+                    identifier for identifier, timestamps in shard.items()
+                    if not timestamps or now - timestamps[-1] >= self.window_seconds
+                ]
+                for identifier in idle:
+                    del shard[identifier]
+            removed += len(idle)
+        return removed
 
 
 # Global rate limiter instance
@@ -99,19 +111,14 @@ def get_rate_limiter(max_requests: int = 8) -> RateLimiter:
     return _rate_limiter
 
 
-async def rate_limit_dependency(request: Request) -> None:
+async def purge_idle_identifiers_periodically(limiter: RateLimiter, interval_seconds: float | None = None) -> None:
     """
-    FastAPI dependency for rate limiting
-    Raises HTTPException if limit exceeded
+    Background task (started from the app lifespan): periodically drops idle
+    identifiers from the limiter. Runs until cancelled.
     """
-    from app.config import get_settings
-    settings = get_settings()
-    
-    limiter = get_rate_limiter(max_requests=settings.RATE_LIMIT_REQUESTS)
-    identifier = limiter.get_identifier(request)
-    
-    if not limiter.check_rate_limit(identifier):
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Rate limit exceeded: max {settings.RATE_LIMIT_REQUESTS} requests per minute"
-        )
+    interval = interval_seconds if interval_seconds is not None else limiter.window_seconds
+    while True:
+        await asyncio.sleep(interval)
+        removed = limiter.purge_idle()
+        if removed:
+            logger.debug("Purged %d idle identifiers", removed)
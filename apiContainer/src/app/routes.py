@@ -13,24 +13,25 @@ Procesa:
   4. Retorna respuesta con datos normalizados + resultado ML
 
 Protecciones:
-  - Rate limiting: 8 requests/minute por IP
+  - Rate limiting: 8 requests/minute por IP y por worker (API_WORKERS)
   - Request size limit: 100 KB max
   - Points limit: 100-1200 puntos
 """
-from fastapi import APIRouter, HTTPException, status, Depends, Request, Header
+from fastapi import APIRouter, HTTPException, status, Request, Header
+from fastapi.responses import ORJSONResponse
 import logging
 from .models import NormalizationRequest, NormalizationResponse, EnrollmentRequest, EnrollmentResponse
 from .normalizer import normalize_stroke
 from .cloud_service import send_to_ml_service, send_enrollment_to_ml_service
 from .backend_service import forward_step_up_to_public_gateway
-from .rate_limiter import rate_limit_dependency
+from .serialization import ORJSONRoute
 
 logger = logging.getLogger(__name__)
-router = APIRouter(tags=["Biometric Normalization"])
+router = APIRouter(tags=["Biometric Normalization"], route_class=ORJSONRoute)
 
 
-@router.post("/normalize", response_model=NormalizationResponse, dependencies=[Depends(rate_limit_dependency)])
-async def normalize_biometric(request: NormalizationRequest) -> NormalizationResponse:
+@router.post("/normalize", response_model=NormalizationResponse)
+async def normalize_biometric(request: NormalizationRequest) -> ORJSONResponse:
     """
     Endpoint principal: Recibe stroke, normaliza, envía a ML en la nube
     
@@ -52,47 +53,46 @@ async def normalize_biometric(request: NormalizationRequest) -> NormalizationRes
     """
     try:
         # 1. Normalizar datos del stroke (padding si es necesario)
-        logger.info(f"Recibido stroke con {len(request.stroke_points)} puntos, duración: {request.stroke_duration_ms}ms")
-        
-        try:
-            normalized_points, features = normalize_stroke(request)
-            logger.info(f"✓ Stroke normalizado: {len(request.stroke_points)} → {len(normalized_points)} puntos")
-        except ValueError as e:
-            logger.error(f"Error en normalización: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Normalization error: {str(e)}"
-            )
+        logger.info("Recibido stroke con %d puntos, duración: %dms", len(request.stroke_points), request.stroke_duration_ms)
+        normalized_stroke, features = normalize_stroke(request)
+        logger.info("✓ Stroke normalizado: %d → %d puntos", len(request.stroke_points), len(normalized_stroke))
         
         # 2. Enviar a servicio ML en la nube (HTTPS/TLS)
-        logger.info(f"Enviando a servicio ML: {len(normalized_points)} puntos normalizados + features")
-        
-        try:
-            ml_response = send_to_ml_service(normalized_points, features)
-            logger.info(f"✓ Respuesta de ML recibida: {ml_response}")
-        except HTTPException:
-            raise
+        ml_response = await send_to_ml_service(normalized_stroke, features)
+        logger.info("✓ Respuesta de ML recibida: %s", ml_response)
         
         # 3. Retornar respuesta exitosa
-        return NormalizationResponse(
-            status="success",
-            message="Biometric data normalized and validated successfully",
-            normalized_stroke=normalized_points,
-            features=features,
-            ml_response=ml_response,
-        )
-        
+        # Los puntos ya se validaron al entrar y el normalizador solo los recorta,
+        # escala o rellena: se serializan directo con orjson, sin pasar por
+        # Pydantic (response_model queda solo para documentar el esquema)
+        return ORJSONResponse({
+            "status": "success",
+            "message": "Biometric data normalized and validated successfully",
+            "normalized_stroke": normalized_stroke.to_point_dicts(),
+            "features": features,
+            "ml_response": ml_response,
+            "error": None,
+        })
+    
+    # HTTPException ya viene registrada por quien la lanza (cloud_service)
     except HTTPException:
         raise
+    except ValueError as e:
+        # Límites de puntos (normalize_stroke)
+        logger.warning("Error en normalización: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Normalization error: {str(e)}"
+        )
     except Exception as e:
-        logger.error(f"Error inesperado: {str(e)}", exc_info=True)
+        logger.exception("Error inesperado: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Internal error: {str(e)}"
         )
 
 
-@router.post("/enroll", response_model=EnrollmentResponse, dependencies=[Depends(rate_limit_dependency)])
+@router.post("/enroll", response_model=EnrollmentResponse)
 async def enroll_biometric_master(request: Request, payload: EnrollmentRequest) -> EnrollmentResponse:
     """
     Endpoint intermedio para registro.
@@ -143,8 +143,8 @@ async def enroll_biometric_master(request: Request, payload: EnrollmentRequest)
         )
 
 
-@router.post("/auth/step-up", dependencies=[Depends(rate_limit_dependency)])
-@router.post("/api/auth/step-up", dependencies=[Depends(rate_limit_dependency)])
+@router.post("/auth/step-up")
+@router.post("/api/auth/step-up")
 async def step_up_signature_login(
     request: NormalizationRequest,
     authorization: str = Header(...),
@@ -160,7 +160,7 @@ async def step_up_signature_login(
     try:
         raw_signature = {
             "timestamp": request.timestamp,
-            "stroke_points": [{"x": p.x, "y": p.y, "t": p.t, "p": p.p} for p in request.stroke_points],
+            "stroke_points": request.stroke_points.to_point_dicts(),
             "stroke_duration_ms": request.stroke_duration_ms,
             "real_length": len(request.stroke_points),
         }
@@ -5,11 +5,164 @@ import jwt
 from pathlib import Path
 from fastapi import HTTPException, status
 from datetime import datetime
+from collections import OrderedDict
+from functools import lru_cache
 import base64
+import hashlib
+import hmac
+import logging
+import threading
+import time
+import orjson
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
 from .config import get_settings
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Valores del hot path leídos una sola vez de settings
+_JWT_KEY_PATH = Path(settings.JWT_PUBLIC_KEY_PATH)
+_JWT_ALGORITHMS = [settings.JWT_ALGORITHM]
+# iss/aud aceptados como sets: se validan con una pertenencia O(1) tras decode
+_JWT_ISSUERS = frozenset({settings.JWT_ISSUER})
+_JWT_AUDIENCES = frozenset({settings.JWT_AUDIENCE})
+_JWT_DECODE_OPTIONS = {"verify_iss": False, "verify_aud": False}
+
+# Credenciales del signature provider ya en bytes para hmac.compare_digest
+_SIGNATURE_PROVIDER_USERNAME = settings.SIGNATURE_PROVIDER_USERNAME.encode()
+_SIGNATURE_PROVIDER_PASSWORD = settings.SIGNATURE_PROVIDER_PASSWORD.encode()
+
+# Tokens validados recientemente: evita repetir la verificación RSA mientras el
+# cliente reutiliza el mismo bearer. Clave = BLAKE2b del token (no se guarda el
+# token en claro), valor = (exp, payload). Solo se cachean validaciones exitosas
+# con firma verificada (nunca los payloads del modo desarrollo).
+_JWT_CACHE_MAX_ENTRIES = 10_000
+_jwt_cache: "OrderedDict[bytes, tuple[float, dict]]" = OrderedDict()
+_jwt_cache_lock = threading.Lock()
+
+
+def _jwt_cache_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+def _jwt_cache_get(key: bytes) -> dict | None:
+    with _jwt_cache_lock:
+        entry = _jwt_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del _jwt_cache[key]
+            return None
+        _jwt_cache.move_to_end(key)
+        return payload
+
+
+def _jwt_cache_put(key: bytes, payload: dict) -> None:
+    # Sin exp no hay un instante seguro hasta el que reutilizar la validación
+    exp = payload.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return
+    with _jwt_cache_lock:
+        _jwt_cache[key] = (float(exp), payload)
+        _jwt_cache.move_to_end(key)
+        while len(_jwt_cache) > _JWT_CACHE_MAX_ENTRIES:
+            _jwt_cache.popitem(last=False)
+
+
+# La clave pública rota muy rara vez: se parsea una vez y solo se vuelve a
+# mirar el archivo (stat) cada _JWT_KEY_RECHECK_SECONDS para soportar rotación
+_JWT_KEY_RECHECK_SECONDS = 60.0
+_jwt_key_checked_at = float("-inf")
+_jwt_key_mtime_ns: int | None = None
+_jwt_dev_mode_warned = False
+
+
+@lru_cache(maxsize=1)
+def _load_public_key(path: Path, mtime_ns: int):
+    """Lee y parsea el PEM (mtime_ns forma parte de la clave de caché)"""
+    with open(path, 'rb') as f:
+        return load_pem_public_key(f.read())
+
+
+def _public_key():
+    """
+    Returns the parsed public key, or None when the key file does not exist
+    (development mode)
+    """
+    global _jwt_key_checked_at, _jwt_key_mtime_ns, _jwt_dev_mode_warned
+    now = time.monotonic()
+    if now - _jwt_key_checked_at >= _JWT_KEY_RECHECK_SECONDS:
+        try:
+            mtime_ns = _JWT_KEY_PATH.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+        if mtime_ns != _jwt_key_mtime_ns:
+            # Clave rotada (o cambio dev <-> prod): lo validado antes ya no vale
+            with _jwt_cache_lock:
+                _jwt_cache.clear()
+            _jwt_key_mtime_ns = mtime_ns
+        _jwt_key_checked_at = now
+    if _jwt_key_mtime_ns is None:
+        if not _jwt_dev_mode_warned:
+            # Se avisa una sola vez, no en cada validación
+            logger.warning("JWT validation disabled (key file not found: %s)", _JWT_KEY_PATH)
+            _jwt_dev_mode_warned = True
+        return None
+    return _load_public_key(_JWT_KEY_PATH, _jwt_key_mtime_ns)
+
+
+# Sondeo al arrancar: resuelve dev/prod y parsea la clave antes de la primera
+# petición. Un PEM inválido no rompe el import; se reporta como 401 al validar.
+try:
+    _public_key()
+except Exception:
+    pass
+
+
+def _decode_unverified(token: str) -> dict:
+    """
+    Development mode: only base64url-decodes the payload segment (no header,
+    algorithm or key handling as jwt.decode would still do)
+    """
+    try:
+        _, payload_b64, _ = token.split(".", 2)
+        payload = orjson.loads(base64.urlsafe_b64decode(payload_b64 + "=" * (-len(payload_b64) % 4)))
+    except ValueError:
+        raise jwt.DecodeError("Invalid token format")
+    if not isinstance(payload, dict):
+        raise jwt.DecodeError("Invalid payload string: must be a json object")
+    return payload
+
+
+def _verify_issuer_audience(payload: dict) -> None:
+    """
+    Checks iss/aud against the accepted sets, raising the same PyJWT errors
+    (and messages) that jwt.decode would raise with issuer=/audience=
+    """
+    if "iss" not in payload:
+        raise jwt.MissingRequiredClaimError("iss")
+    if not isinstance(payload["iss"], str):
+        raise jwt.InvalidIssuerError("Payload Issuer (iss) must be a string")
+    if payload["iss"] not in _JWT_ISSUERS:
+        raise jwt.InvalidIssuerError("Invalid issuer")
+
+    aud = payload.get("aud")
+    if not aud:
+        raise jwt.MissingRequiredClaimError("aud")
+    if isinstance(aud, str):
+        if aud not in _JWT_AUDIENCES:
+            raise jwt.InvalidAudienceError("Audience doesn't match")
+        return
+    if not isinstance(aud, list) or not all(isinstance(c, str) for c in aud):
+        raise jwt.InvalidAudienceError("Invalid claim format in token")
+    if _JWT_AUDIENCES.isdisjoint(aud):
+        raise jwt.InvalidAudienceError("Audience doesn't match")
+
+
+# El motivo concreto del 401 solo se expone en DEBUG
+_DEBUG = settings.DEBUG
+
 
 def validate_jwt_token(token: str) -> dict:
     """
@@ -25,36 +178,49 @@ def validate_jwt_token(token: str) -> dict:
         HTTPException: If token is invalid
     """
     try:
-        # In development, allow empty key file
-        jwt_key_path = Path(settings.JWT_PUBLIC_KEY_PATH)
+        # In development, allow empty key file. Se resuelve antes del cache: el
+        # recheck periódico de la clave lo vacía si la clave rotó o apareció
+        public_key = _public_key()
         
-        if not jwt_key_path.exists():
-            # Development mode: accept token without validation
-            print("⚠️  JWT validation disabled (key file not found)")
-            return jwt.decode(token, options={"verify_signature": False}, algorithms=["RS256"])
+        if public_key is None:
+            # Development mode: accept token without validation (sin cachear)
+            return dict(_decode_unverified(token))
         
-        with open(jwt_key_path, 'r') as f:
-            public_key = f.read()
+        cache_key = _jwt_cache_key(token)
+        cached = _jwt_cache_get(cache_key)
+        if cached is not None:
+            return dict(cached)
         
         payload = jwt.decode(
             token,
             public_key,
-            algorithms=[settings.JWT_ALGORITHM],
-            issuer=settings.JWT_ISSUER,
-            audience=settings.JWT_AUDIENCE,
+            algorithms=_JWT_ALGORITHMS,
+            options=_JWT_DECODE_OPTIONS,
         )
-        return payload
+        _verify_issuer_audience(payload)
+        _jwt_cache_put(cache_key, payload)
+        return dict(payload)
         
     except jwt.InvalidTokenError as e:
+        if _DEBUG:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Invalid token: {str(e)}"
+            )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Invalid token: {str(e)}"
-        )
+            detail="Invalid token"
+        ) from e
     except Exception as e:
+        if _DEBUG:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Token validation error: {str(e)}"
+            )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Token validation error: {str(e)}"
-        )
+            detail="Token validation error"
+        ) from e
 
 
 def validate_signature_provider(username: str, password: str) -> bool:
@@ -68,12 +234,17 @@ def validate_signature_provider(username: str, password: str) -> bool:
     Returns:
         bool: True if valid, False otherwise
     """
+    # Comparación en tiempo constante; "&" (no "and") evalúa siempre ambas
     return (
-        username == settings.SIGNATURE_PROVIDER_USERNAME and
-        password == settings.SIGNATURE_PROVIDER_PASSWORD
+        hmac.compare_digest(username.encode(), _SIGNATURE_PROVIDER_USERNAME) &
+        hmac.compare_digest(password.encode(), _SIGNATURE_PROVIDER_PASSWORD)
     )
 
 
+_BASIC_PREFIX = b"Basic "
+
+
+@lru_cache(maxsize=16)
 def create_basic_auth_header(username: str, password: str) -> str:
     """
     Create HTTP Basic Authentication header
@@ -85,6 +256,13 @@ def create_basic_auth_header(username: str, password: str) -> str:
     Returns:
         str: Authorization header value
     """
-    credentials = f"{username}:{password}"
-    encoded = base64.b64encode(credentials.encode()).decode()
-    return f"Basic {encoded}"
+    # UTF-8 (no ascii) para no romper credenciales con caracteres no ASCII
+    credentials = f"{username}:{password}".encode()
+    return (_BASIC_PREFIX + base64.b64encode(credentials)).decode("ascii")
+
+
+# Header Basic del signature provider, fijo para toda la vida del proceso
+SIGNATURE_PROVIDER_AUTH_HEADER = create_basic_auth_header(
+    settings.SIGNATURE_PROVIDER_USERNAME,
+    settings.SIGNATURE_PROVIDER_PASSWORD,
+)
@@ -28,10 +28,31 @@ if __name__ == "__main__":
     print("=" * 80)
     print()
     
-    uvicorn.run(
-        "app:app",
-        host=settings.API_HOST,
-        port=settings.API_PORT,
-        reload=settings.DEBUG,
-        log_level=settings.LOG_LEVEL.lower(),
-    )
+    if settings.DEBUG:
+        uvicorn.run(
+            "app:app",
+            host=settings.API_HOST,
+            port=settings.API_PORT,
+            reload=True,
+            log_level=settings.LOG_LEVEL.lower(),
+        )
+    else:
+        api_workers = max(1, settings.API_WORKERS)
+        if api_workers > 1:
+            # Rate limiter y caches viven en memoria de cada proceso
+            print(
+                f"WARNING: {api_workers} workers: rate limiting is per worker, so the "
+                f"effective per-IP limit is up to {api_workers}x the configured one."
+            )
+
+        # Sin reloader y con un proceso por worker; loop/http en "auto" usan
+        # uvloop y httptools (uvicorn[standard]) donde estén disponibles
+        uvicorn.run(
+            "app:app",
+            host=settings.API_HOST,
+            port=settings.API_PORT,
+            workers=api_workers,
+            loop="auto",
+            http="auto",
+            log_level=settings.LOG_LEVEL.lower(),
+        )
@@ -6,16 +6,17 @@ import secrets
 from typing import Optional
 from fastapi import HTTPException, Security, status
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from app.config import settings
 
 security = HTTPBasic()
 
-# Load credentials from environment
-EXPECTED_USERNAME = os.getenv("ML_SERVICE_USERNAME", "bmfa_user")
-EXPECTED_PASSWORD = os.getenv("ML_SERVICE_PASSWORD", "your_secure_password_here")
+# Credentials come from settings (config.py already loaded .env); encoded once
+# here so verify_credentials doesn't re-encode constants on every request
+EXPECTED_USERNAME = settings.ml_service_username
+EXPECTED_PASSWORD = settings.ml_service_password
+_EXPECTED_USERNAME_BYTES = EXPECTED_USERNAME.encode("utf8")
+_EXPECTED_PASSWORD_BYTES = EXPECTED_PASSWORD.encode("utf8")
 
 
 def verify_credentials(credentials: HTTPBasicCredentials = Security(security)) -> bool:
@@ -35,11 +36,11 @@ def verify_credentials(credentials: HTTPBasicCredentials = Security(security)) -
     # Use secrets.compare_digest for constant-time comparison
     correct_username = secrets.compare_digest(
         credentials.username.encode("utf8"),
-        EXPECTED_USERNAME.encode("utf8")
+        _EXPECTED_USERNAME_BYTES
     )
     correct_password = secrets.compare_digest(
         credentials.password.encode("utf8"),
-        EXPECTED_PASSWORD.encode("utf8")
+        _EXPECTED_PASSWORD_BYTES
     )
     
     if not (correct_username and correct_password):
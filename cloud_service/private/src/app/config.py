@@ -61,6 +61,12 @@ class Settings(BaseSettings):
     # ========================
     rate_limit_requests: int = int(os.getenv("RATE_LIMIT_REQUESTS", "20"))
     rate_limit_window_seconds: int = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+    # Opcional: ventana compartida entre workers/réplicas (redis://host:6379/0)
+    rate_limit_redis_url: str = os.getenv("RATE_LIMIT_REDIS_URL", "")
+    # sliding: ventana deslizante exacta | fixed: contador por ventana fija (INCR)
+    rate_limit_algorithm: str = os.getenv("RATE_LIMIT_ALGORITHM", "sliding").lower()
+    # false: ignorar X-Forwarded-For / X-Real-IP (conexión directa, sin proxy)
+    trust_proxy_headers: bool = os.getenv("TRUST_PROXY_HEADERS", "true").lower() == "true"
 
     # ========================
     # STROKE VALIDATION
@@ -68,6 +74,8 @@ class Settings(BaseSettings):
     min_stroke_points: int = int(os.getenv("MIN_STROKE_POINTS", "100"))
     max_stroke_points: int = int(os.getenv("MAX_STROKE_POINTS", "1200"))
     model_input_points: int = int(os.getenv("MODEL_INPUT_POINTS", "100"))
+    # Tope de puntos que entran al pipeline SciPy (resampling/filtros)
+    preprocess_max_points: int = int(os.getenv("PREPROCESS_MAX_POINTS", "1200"))
     
     # ========================
     # MODEL CONFIGURATION
@@ -81,6 +89,12 @@ class Settings(BaseSettings):
     confidence_threshold: float = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))
     lstm_similarity_threshold: float = float(os.getenv("LSTM_SIMILARITY_THRESHOLD", "0.75"))
     max_request_size: int = int(os.getenv("MAX_REQUEST_SIZE", "204800"))
+    # Opt-in: reuse the response for byte-identical validation payloads
+    validation_cache_enabled: bool = os.getenv("VALIDATION_CACHE_ENABLED", "false").lower() == "true"
+    validation_cache_max_entries: int = int(os.getenv("VALIDATION_CACHE_MAX_ENTRIES", "1000"))
+    # Batching de inferencia: máximo de firmas por invoke y espera para juntar el batch
+    inference_max_batch: int = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+    inference_batch_wait_ms: float = float(os.getenv("INFERENCE_BATCH_WAIT_MS", "5"))
     model_sequence_length: int = int(os.getenv("MODEL_SEQUENCE_LENGTH", "100"))
     model_features_per_point: int = int(os.getenv("MODEL_FEATURES_PER_POINT", "4"))
     
@@ -5,19 +5,17 @@ import os
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from . import routes as routes_module
 from .routes import router
 from .utils import RateLimiter
 from .config import settings
 from .database import db_connection
-from .model_loader import load_ml_model
-
-# Load environment variables
-load_dotenv()
+from .model_loader import InferenceWorker, load_ml_model
 
 # Configure logging
 logging.basicConfig(
@@ -58,21 +56,31 @@ async def lifespan(app: FastAPI):
         logger.error("✗ Failed to connect to MongoDB - service will run with limited functionality")
     
     model = load_ml_model()
-    routes_module.model_loaded = model is not None
-    if routes_module.model_loaded:
+    if model is not None:
         app.state.ml_model = model
+        app.state.inference_worker = InferenceWorker(
+            model,
+            max_batch=settings.inference_max_batch,
+            max_wait_ms=settings.inference_batch_wait_ms,
+        )
+        app.state.inference_worker.start()
         logger.info("Model loading completed successfully")
     else:
         logger.error("Model loading failed - service will run without ML inference")
     
+    routes_module.rate_limiter.start_cleanup_task()
     logger.info("Startup complete - Ready to accept requests")
     
     yield
     
     # Shutdown
     logger.info("Shutting down Cloud Service")
+    inference_worker = getattr(app.state, "inference_worker", None)
+    if inference_worker is not None:
+        await inference_worker.stop()
     db_connection.disconnect()
     logger.info("MongoDB connection closed")
+    await routes_module.rate_limiter.aclose()
 
 
 # Create FastAPI application
@@ -80,7 +88,9 @@ app = FastAPI(
     title="Biometric Signature Validation Service",
     description="Cloud service for validating biometric signature data using LSTM",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # orjson serializa las respuestas (details anidados) más rápido que json.dumps
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -100,7 +110,7 @@ async def global_exception_handler(request: Request, exc: Exception):
     Global exception handler for unhandled errors
     """
     logger.error(f"Unhandled exception: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "detail": "Internal server error",
@@ -109,25 +119,68 @@ async def global_exception_handler(request: Request, exc: Exception):
     )
 
 
-# Request size limiter middleware
-@app.middleware("http")
-async def limit_request_size(request: Request, call_next):
+# Límite fijo para toda la vida del proceso (.env ya cargado por config.py)
+MAX_REQUEST_SIZE = settings.max_request_size
+
+
+class BodySizeLimitMiddleware:
     """
-    Middleware to limit request body size
+    Pure ASGI middleware to limit request body size
+
+    Solo lee el header Content-Length del scope: sin construir Request/Response
+    ni el límite async extra de BaseHTTPMiddleware alrededor del body.
+    GET/HEAD y los endpoints sin body (/, /health) pasan directo.
     """
-    max_size = settings.max_request_size
-    
-    # Check Content-Length header
-    content_length = request.headers.get("content-length")
-    if content_length and int(content_length) > max_size:
-        logger.warning(f"Request too large: {content_length} > {max_size}")
-        return JSONResponse(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            content={"detail": f"Request body too large: max {max_size} bytes"}
-        )
-    
-    response = await call_next(request)
-    return response
+
+    SKIP_METHODS = frozenset({"GET", "HEAD"})
+    SKIP_PATHS = frozenset({"/", "/health"})
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] in self.SKIP_METHODS
+            or scope["path"] in self.SKIP_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = None
+        for key, value in scope["headers"]:
+            if key == b"content-length":
+                content_length = value
+                break
+
+        if content_length:
+            try:
+                size = int(content_length)
+            except ValueError:
+                response = ORJSONResponse(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    content={"detail": "Invalid Content-Length header"}
+                )
+                await response(scope, receive, send)
+                return
+            if size > MAX_REQUEST_SIZE:
+                logger.warning(f"Request too large: {size} > {MAX_REQUEST_SIZE}")
+                response = ORJSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": f"Request body too large: max {MAX_REQUEST_SIZE} bytes"}
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+
+# Request size limiter middleware
+app.add_middleware(BodySizeLimitMiddleware)
+
+# Compress JSON responses over ~1 KB (details / templates) when the client
+# sends Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
 
 
 # Include routes
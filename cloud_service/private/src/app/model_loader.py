@@ -4,6 +4,7 @@ The production artifact is a .tflite file generated by export_tflite.py.
 No Keras / training dependencies are imported here.
 """
 import os
+import asyncio
 import logging
 import numpy as np
 
@@ -91,4 +92,109 @@ def compute_embedding(interpreter, preprocessed_signature_tensor):
     interpreter.invoke()
     embedding = interpreter.get_tensor(output_details[0]["index"])
 
-    return embedding[0]  # (embedding_dim,)
\ No newline at end of file
+    return embedding[0]  # (embedding_dim,)
+
+
+class InferenceWorker:
+    """
+    Agrupa las inferencias concurrentes en un solo invoke del intérprete.
+
+    Cada request hace await de un future; una única tarea drena la cola, apila
+    hasta max_batch tensores (400, N_FEATURES) y ejecuta el batch en un hilo.
+    Como solo esta tarea toca el intérprete, el acceso queda serializado
+    (tflite.Interpreter no es thread-safe). Si el modelo tiene batch fijo se
+    invoca muestra por muestra dentro del mismo ciclo.
+    """
+
+    def __init__(self, interpreter, max_batch: int = 8, max_wait_ms: float = 5.0):
+        self.interpreter = interpreter
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+
+        input_details = interpreter.get_input_details()[0]
+        shape_signature = input_details.get("shape_signature", input_details["shape"])
+        # Batch dinámico (-1) en el modelo exportado: un solo invoke por batch
+        self._dynamic_batch = len(shape_signature) > 0 and int(shape_signature[0]) == -1
+        self._input_index = input_details["index"]
+        self._output_index = interpreter.get_output_details()[0]["index"]
+        self._allocated_shape = tuple(int(dim) for dim in input_details["shape"])
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, preprocessed_signature_tensor) -> np.ndarray:
+        """Encola un tensor (400, N_FEATURES) y devuelve su embedding (embedding_dim,)"""
+        tensor = np.asarray(preprocessed_signature_tensor, dtype=np.float32)
+        if tensor.ndim == 3:
+            tensor = tensor[0]
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((tensor, future))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            items = [await self._queue.get()]
+            # Solo se espera a juntar un batch si ya hay otros requests en cola
+            if self.max_wait and not self._queue.empty():
+                await asyncio.sleep(self.max_wait)
+            while len(items) < self.max_batch and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+
+            # Un batch por shape: p.ej. live (400, 8) y referencia repo_compat (400, 4)
+            # no se pueden apilar juntos
+            groups = {}
+            for item in items:
+                if not item[1].done():
+                    groups.setdefault(item[0].shape, []).append(item)
+
+            for group in groups.values():
+                await self._run_group(group)
+
+    async def _run_group(self, group) -> None:
+        try:
+            batch = np.stack([tensor for tensor, _ in group])
+            embeddings = await asyncio.to_thread(self._infer_batch, batch)
+        except Exception as error:
+            if len(group) == 1:
+                future = group[0][1]
+                if not future.done():
+                    future.set_exception(error)
+                return
+            # Reintento muestra por muestra: solo falla el future del tensor problemático
+            for item in group:
+                await self._run_group([item])
+            return
+
+        for (_, future), embedding in zip(group, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    def _infer_batch(self, batch: np.ndarray) -> np.ndarray:
+        if not self._dynamic_batch:
+            return np.stack([compute_embedding(self.interpreter, tensor) for tensor in batch])
+
+        if self._allocated_shape != batch.shape:
+            # Si el resize falla el intérprete queda en un estado desconocido: se
+            # fuerza un resize en el próximo batch
+            self._allocated_shape = None
+            self.interpreter.resize_tensor_input(self._input_index, batch.shape)
+            self.interpreter.allocate_tensors()
+            self._allocated_shape = batch.shape
+
+        self.interpreter.set_tensor(self._input_index, batch)
+        self.interpreter.invoke()
+        # Copia: el buffer de salida se reutiliza en el siguiente invoke
+        return np.array(self.interpreter.get_tensor(self._output_index))
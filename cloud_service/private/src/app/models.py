@@ -1,15 +1,22 @@
 """
 Pydantic models for request/response validation
 """
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, field_validator
+import base64
+from dataclasses import dataclass
+from typing import Annotated, List, Optional, Dict, Any
+import numpy as np
+from pydantic import BaseModel, Field, PlainValidator, PlainSerializer, TypeAdapter, field_validator, model_validator
+
+
+# t se guarda en int64: un valor >= 2**63 daría la vuelta a negativo al castear
+_T_LIMIT = 2 ** 63
 
 
 class StrokePoint(BaseModel):
     """Individual point in a signature stroke"""
     x: float = Field(..., description="X coordinate in pixels")
     y: float = Field(..., description="Y coordinate in pixels")
-    t: int = Field(..., description="Timestamp in milliseconds", ge=0)
+    t: int = Field(..., description="Timestamp in milliseconds", ge=0, lt=_T_LIMIT)
     p: float = Field(..., description="Pressure value", ge=0.0, le=1.0)
 
     @field_validator('x', 'y')
@@ -20,6 +27,150 @@ class StrokePoint(BaseModel):
         return float(v)
 
 
+@dataclass(frozen=True, eq=False)
+class Stroke:
+    """
+    Trazo en layout columnar (struct-of-arrays): una columna NumPy por campo,
+    x/y/p en float64 y t en int64 (ms). El pipeline trabaja sobre columnas
+    contiguas en lugar de un StrokePoint por punto
+    """
+    x: np.ndarray
+    y: np.ndarray
+    t: np.ndarray
+    p: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    def __getitem__(self, index: slice) -> "Stroke":
+        return Stroke(x=self.x[index], y=self.y[index], t=self.t[index], p=self.p[index])
+
+    def to_point_dicts(self) -> List[Dict[str, Any]]:
+        """Lista de {x, y, t, p} (formato de cable del public gateway)"""
+        return [
+            {"x": x, "y": y, "t": t, "p": p}
+            for x, y, t, p in zip(self.x.tolist(), self.y.tolist(), self.t.tolist(), self.p.tolist())
+        ]
+
+
+STROKE_MIN_POINTS = 100
+STROKE_MAX_POINTS = 1200
+
+_stroke_points_adapter = TypeAdapter(
+    Annotated[List[StrokePoint], Field(min_length=STROKE_MIN_POINTS, max_length=STROKE_MAX_POINTS)]
+)
+
+
+def _stroke_from_columns(x: np.ndarray, y: np.ndarray, t: np.ndarray, p: np.ndarray) -> Optional[Stroke]:
+    """
+    Comprueba las columnas float64 con las mismas reglas que StrokePoint
+    (más los límites de longitud) y devuelve el Stroke, o None si algo no cuadra
+    """
+    if not (
+        x.ndim == y.ndim == t.ndim == p.ndim == 1
+        and STROKE_MIN_POINTS <= len(x) <= STROKE_MAX_POINTS
+        and len(x) == len(y) == len(t) == len(p)
+        and np.isfinite(x).all()
+        and np.isfinite(y).all()
+        and np.isfinite(t).all()
+        and (t >= 0).all()
+        and (t < _T_LIMIT).all()
+        and (t == np.floor(t)).all()
+        and ((p >= 0.0) & (p <= 1.0)).all()
+    ):
+        return None
+    return Stroke(x=x, y=y, t=t.astype(np.int64), p=p)
+
+
+def _parse_stroke(value: Any) -> Stroke:
+    """
+    Valida los puntos columna por columna en lugar de instanciar un StrokePoint
+    por punto. Si la vía rápida falla se delega en la validación de StrokePoint,
+    que produce los mismos errores 422 de siempre.
+    """
+    if isinstance(value, Stroke):
+        return value
+    try:
+        if STROKE_MIN_POINTS <= len(value) <= STROKE_MAX_POINTS:
+            # Una lista plana de floats por columna: directo a arrays contiguos,
+            # sin la lista de tuplas ni la matriz (n, 4) transpuesta intermedia
+            stroke = _stroke_from_columns(
+                *(np.array([pt[key] for pt in value], dtype=np.float64) for key in ("x", "y", "t", "p"))
+            )
+            if stroke is not None:
+                return stroke
+    except (KeyError, TypeError, ValueError):
+        pass
+
+    points = _stroke_points_adapter.validate_python(value)
+    return Stroke(
+        x=np.array([pt.x for pt in points], dtype=np.float64),
+        y=np.array([pt.y for pt in points], dtype=np.float64),
+        t=np.array([pt.t for pt in points], dtype=np.int64),
+        p=np.array([pt.p for pt in points], dtype=np.float64),
+    )
+
+
+def _decode_packed_stroke(stroke_b64: Any, n: Any, xy_scale: Any) -> Stroke:
+    """
+    Decodifica el formato "packed" de apiContainer (ML_PAYLOAD_FORMAT=packed):
+    buffer little-endian x[n] int16 | y[n] int16 | t[n] int32 | p[n] uint8 en
+    base64, con x/y = int16 / xy_scale y p = uint8 / 255
+    """
+    if not isinstance(stroke_b64, str) or not isinstance(n, int) or isinstance(n, bool):
+        raise ValueError("Packed stroke requires stroke_b64 (str) and n (int)")
+    if not isinstance(xy_scale, (int, float)) or isinstance(xy_scale, bool) or not 0 < xy_scale < float("inf"):
+        raise ValueError("Packed stroke requires a positive, finite xy_scale")
+    try:
+        buffer = base64.b64decode(stroke_b64, validate=True)
+    except ValueError:
+        raise ValueError("stroke_b64 is not valid base64")
+    if n < 0 or len(buffer) != 9 * n:
+        raise ValueError(f"stroke_b64 holds {len(buffer)} bytes, expected 9 * n = {9 * n}")
+
+    stroke = _stroke_from_columns(
+        np.frombuffer(buffer, "<i2", n, 0) / xy_scale,
+        np.frombuffer(buffer, "<i2", n, 2 * n) / xy_scale,
+        np.frombuffer(buffer, "<i4", n, 4 * n).astype(np.float64),
+        np.frombuffer(buffer, "u1", n, 8 * n) / 255.0,
+    )
+    if stroke is None:
+        raise ValueError(
+            f"Packed stroke must have {STROKE_MIN_POINTS}-{STROKE_MAX_POINTS} points and t >= 0"
+        )
+    return stroke
+
+
+def _decode_stroke_columns(columns: Any) -> Stroke:
+    """
+    Decodifica el formato "columns" de apiContainer (ML_PAYLOAD_FORMAT=columns):
+    {"x": [...], "y": [...], "t": [...], "p": [...]}, una lista por campo
+    """
+    if not isinstance(columns, dict):
+        raise ValueError("stroke_columns must be an object with x, y, t and p lists")
+    try:
+        stroke = _stroke_from_columns(
+            *(np.array(columns[key], dtype=np.float64) for key in ("x", "y", "t", "p"))
+        )
+    except KeyError as e:
+        raise ValueError(f"stroke_columns is missing column {e}")
+    except TypeError:
+        raise ValueError("stroke_columns must hold numeric lists")
+    if stroke is None:
+        raise ValueError(
+            f"stroke_columns must hold {STROKE_MIN_POINTS}-{STROKE_MAX_POINTS} points per column, "
+            "t >= 0 (integer ms) and p in [0, 1]"
+        )
+    return stroke
+
+
+StrokeArray = Annotated[
+    Stroke,
+    PlainValidator(_parse_stroke, json_schema_input_type=List[StrokePoint]),
+    PlainSerializer(lambda stroke: stroke.to_point_dicts(), return_type=List[Dict[str, Any]]),
+]
+
+
 class BiometricFeatures(BaseModel):
     """Extracted features from normalized stroke"""
     num_points: int = Field(..., description="Number of points after normalization")
@@ -31,11 +182,9 @@ class BiometricFeatures(BaseModel):
 
 class BiometricRequest(BaseModel):
     """Request payload from apiContainer"""
-    normalized_stroke: List[StrokePoint] = Field(
+    normalized_stroke: StrokeArray = Field(
         ..., 
         description="Normalized stroke points (100-1200 points)",
-        min_length=100,
-        max_length=1200
     )
     features: BiometricFeatures = Field(..., description="Extracted features")
     real_length: int = Field(..., description="Original length before padding", ge=100)
@@ -44,24 +193,32 @@ class BiometricRequest(BaseModel):
         description="Optional enrollment template used for step-up comparison"
     )
 
-    @field_validator('normalized_stroke')
+    @model_validator(mode="before")
     @classmethod
-    def validate_stroke_length(cls, v):
-        if len(v) < 100:
-            raise ValueError(f'Too few points: {len(v)} < 100')
-        if len(v) > 1200:
-            raise ValueError(f'Too many points: {len(v)} > 1200')
-        return v
+    def decode_compact_stroke(cls, data: Any) -> Any:
+        """
+        apiContainer puede enviar el trazo como stroke_b64/n/xy_scale
+        (ML_PAYLOAD_FORMAT=packed) o como stroke_columns (ML_PAYLOAD_FORMAT=columns)
+        """
+        if not isinstance(data, dict) or "normalized_stroke" in data:
+            return data
+        if "stroke_b64" in data:
+            data = dict(data)
+            data["normalized_stroke"] = _decode_packed_stroke(
+                data.pop("stroke_b64"), data.pop("n", None), data.pop("xy_scale", None)
+            )
+        elif "stroke_columns" in data:
+            data = dict(data)
+            data["normalized_stroke"] = _decode_stroke_columns(data.pop("stroke_columns"))
+        return data
 
 
 class StepUpBiometricRequest(BaseModel):
     """Raw step-up payload forwarded from the public gateway."""
     timestamp: str = Field(..., description="ISO 8601 timestamp of capture")
-    stroke_points: List[StrokePoint] = Field(
+    stroke_points: StrokeArray = Field(
         ...,
-        min_length=100,
-        max_length=1200,
-        description="Raw signature stroke points"
+        description="Raw signature stroke points (100-1200 points)"
     )
     stroke_duration_ms: int = Field(..., description="Total duration in milliseconds", ge=0)
     real_length: int = Field(..., description="Original length before any padding", ge=100)
@@ -83,11 +240,9 @@ class BiometricResponse(BaseModel):
 class EnrollmentSignatureRequest(BaseModel):
     """Raw signature payload used to compute the master feature."""
     timestamp: str = Field(..., description="ISO 8601 timestamp of capture")
-    stroke_points: List[StrokePoint] = Field(
+    stroke_points: StrokeArray = Field(
         ...,
-        min_length=100,
-        max_length=1200,
-        description="Raw signature stroke points"
+        description="Raw signature stroke points (100-1200 points)"
     )
     stroke_duration_ms: int = Field(..., description="Total duration in milliseconds", ge=0)
     real_length: int = Field(..., description="Original length before any padding", ge=100)
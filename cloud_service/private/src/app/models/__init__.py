@@ -19,6 +19,8 @@ def _load_legacy_module(module_name: str, filename: str):
 _legacy = _load_legacy_module("models_legacy", "models.py")
 
 StrokePoint = _legacy.StrokePoint
+Stroke = _legacy.Stroke
+StrokeArray = _legacy.StrokeArray
 BiometricFeatures = _legacy.BiometricFeatures
 BiometricRequest = _legacy.BiometricRequest
 BiometricResponse = _legacy.BiometricResponse
@@ -29,6 +31,8 @@ StepUpBiometricRequest = _legacy.StepUpBiometricRequest
 
 __all__ = [
     "StrokePoint",
+    "Stroke",
+    "StrokeArray",
     "BiometricFeatures",
     "BiometricRequest",
     "BiometricResponse",
@@ -2,19 +2,75 @@
 Advanced preprocessing pipeline for biometric signature data
 Prepares data for LSTM model inference
 """
-import math
 import numpy as np
 from typing import List, Dict, Tuple
 from scipy import signal
 from scipy.interpolate import interp1d
 import logging
+import threading
 from types import SimpleNamespace
 
+from app.config import settings
+from app.models import Stroke
+
 logger = logging.getLogger(__name__)
 
+# dtype del pipeline de inferencia: el modelo TFLite consume float32, así que
+# todo el preprocesamiento trabaja en float32 (la mitad de memoria por pasada)
+DTYPE = np.float32
+
+# Tope de puntos antes de la etapa costosa (Savitzky-Golay, filtros, interp):
+# se lee una sola vez al importar
+PREPROCESS_MAX_POINTS = settings.preprocess_max_points
+
+# Filtro anti-aliasing de resample_to_frequency: Butterworth orden 4, diseñado
+# una sola vez al importar
+_ANTI_ALIASING_SOS = signal.butter(4, 0.8, btype='low', output='sos')
+
+# Rangos de validate_normalization: solo en desarrollo (DEBUG=true)
+_CHECK_NORMALIZATION_BOUNDS = settings.debug
+
+
+# Buffers de trabajo por hilo para los intermedios de preprocess_signature
+# (secuencia resampleada y matriz de features): se reutilizan entre requests en
+# lugar de asignarse cada vez. Nunca salen del pipeline: smooth_coordinates,
+# normalize_features y apply_padding_with_mask devuelven arrays propios
+_RESAMPLE_MAX_POINTS = 2000
+_scratch = threading.local()
+
+
+def _scratch_buffer(name: str, rows: int, cols: int) -> np.ndarray:
+    """Vista (rows, cols) sobre el buffer `name` del hilo actual; crece si no alcanza"""
+    buffer = getattr(_scratch, name, None)
+    if buffer is None or buffer.shape[0] < rows:
+        buffer = np.empty((max(rows, _RESAMPLE_MAX_POINTS), cols), dtype=DTYPE)
+        setattr(_scratch, name, buffer)
+    return buffer[:rows]
+
+
+# Máscaras de apply_padding_with_mask para el largo por defecto (400): la de n
+# puntos reales es la vista [400 - n : 800 - n] de [1]*400 + [0]*400. Es de solo
+# lectura porque se comparte entre requests (los consumidores solo la suman)
+_MASK_TEMPLATE_LENGTH = 400
+_MASK_TEMPLATE = np.concatenate(
+    (np.ones(_MASK_TEMPLATE_LENGTH, dtype=DTYPE), np.zeros(_MASK_TEMPLATE_LENGTH, dtype=DTYPE))
+)
+_MASK_TEMPLATE.setflags(write=False)
+
+
+class SignatureTooLargeError(ValueError):
+    """Payload con más puntos de los que acepta el pipeline de preprocesamiento"""
+
+
+def _check_preprocess_size(stroke_points: Stroke) -> None:
+    if len(stroke_points) > PREPROCESS_MAX_POINTS:
+        raise SignatureTooLargeError(
+            f"Too many points for preprocessing: {len(stroke_points)} > {PREPROCESS_MAX_POINTS}"
+        )
+
 
 def preprocess_signature(
-    stroke_points: List,
+    stroke_points: Stroke,
     real_length: int,
     target_frequency: int = 100,
     target_length: int = 400
@@ -34,7 +90,7 @@ def preprocess_signature(
     9. Padding final con máscara (a 400 puntos)
     
     Args:
-        stroke_points: Lista de puntos normalizados (puede incluir padding)
+        stroke_points: Trazo columnar normalizado (puede incluir padding)
         real_length: Longitud real antes del padding aplicado en apiContainer
         target_frequency: Frecuencia objetivo en Hz (default 100)
         target_length: Longitud objetivo final (default 400)
@@ -44,31 +100,34 @@ def preprocess_signature(
             - features array (target_length, 8): [x, y, vx, vy, v_mag, theta, curv, pressure]
             - mask array (target_length,): 1 para puntos reales, 0 para padding
     """
-    logger.info(f"Starting preprocessing: {len(stroke_points)} points, real_length={real_length}")
+    _check_preprocess_size(stroke_points)
+    logger.debug("Starting preprocessing: %d points, real_length=%d", len(stroke_points), real_length)
     
     # Step 1: Recuperar longitud real (eliminar padding de apiContainer)
     original_sequence = recover_original_sequence(stroke_points, real_length)
-    logger.info(f"Step 1: Recovered original sequence: {len(original_sequence)} points")
+    logger.debug("Step 1: Recovered original sequence: %d points", len(original_sequence))
     
     # Validar que tenemos suficientes puntos
     if len(original_sequence) < 100:
         raise ValueError(f"Signature too short after removing padding: {len(original_sequence)} < 100")
     
     # Step 2: Resampling a frecuencia objetivo (100 Hz)
-    resampled = resample_to_frequency(original_sequence, target_frequency)
-    logger.info(f"Step 2: Resampled to {target_frequency} Hz: {len(resampled)} points")
+    resampled = resample_to_frequency(
+        original_sequence, target_frequency, out=_scratch_buffer("resampled", _RESAMPLE_MAX_POINTS, 4)
+    )
+    logger.debug("Step 2: Resampled to %d Hz: %d points", target_frequency, len(resampled))
     
     # Step 3: Suavizado de coordenadas (Savitzky-Golay filter)
     smoothed = smooth_coordinates(resampled)
-    logger.info(f"Step 3: Smoothed coordinates")
+    logger.debug("Step 3: Smoothed coordinates")
     
     # Step 4-6: Calcular features (velocidad, aceleración, ángulo, curvatura)
-    features = extract_advanced_features(smoothed)
-    logger.info(f"Step 4-6: Extracted features: shape={features.shape}")
+    features = extract_advanced_features(smoothed, out=_scratch_buffer("features", len(smoothed), 8))
+    logger.debug("Step 4-6: Extracted features: shape=%s", features.shape)
     
     # Step 7: Normalización por feature
     features_normalized = normalize_features(features)
-    logger.info(f"Step 7: Normalized features")
+    logger.debug("Step 7: Normalized features")
     
     # Validar normalización
     validate_normalization(features_normalized)
@@ -76,18 +135,18 @@ def preprocess_signature(
     # Step 8: Truncado inteligente si > target_length
     if len(features_normalized) > target_length:
         truncated, valid_indices = intelligent_truncate(features_normalized, target_length)
-        logger.info(f"Step 8: Intelligent truncation: {len(features_normalized)} -> {len(truncated)}")
+        logger.debug("Step 8: Intelligent truncation: %d -> %d", len(features_normalized), len(truncated))
         features_normalized = truncated
     
     # Step 9: Padding final con máscara
     padded_features, mask = apply_padding_with_mask(features_normalized, target_length)
-    logger.info(f"Step 9: Final padding: {len(features_normalized)} -> {padded_features.shape[0]} with mask")
+    logger.debug("Step 9: Final padding: %d -> %d with mask", len(features_normalized), padded_features.shape[0])
     
     return padded_features, mask
 
 
 def preprocess_signature_repo_compat(
-    stroke_points: List,
+    stroke_points: Stroke,
     real_length: int,
     target_length: int = 400,
     robust_percentile: int = 10,
@@ -99,17 +158,18 @@ def preprocess_signature_repo_compat(
     and applies robust coordinate scaling using percentile bounds so capture
     remains stable across different screen sizes.
     """
-    logger.info(
-        f"Starting repo-compat preprocessing: {len(stroke_points)} points, real_length={real_length}"
+    _check_preprocess_size(stroke_points)
+    logger.debug(
+        "Starting repo-compat preprocessing: %d points, real_length=%d", len(stroke_points), real_length
     )
 
     original_sequence = recover_original_sequence(stroke_points, real_length)
-    logger.info(f"Repo-compat step 1: Recovered original sequence: {len(original_sequence)} points")
+    logger.debug("Repo-compat step 1: Recovered original sequence: %d points", len(original_sequence))
 
     if len(original_sequence) < 100:
         raise ValueError(f"Signature too short after removing padding: {len(original_sequence)} < 100")
 
-    sequence = original_sequence.astype(float).copy()
+    sequence = original_sequence.astype(DTYPE, copy=True)
 
     if len(sequence) > target_length:
         center = len(sequence) // 2
@@ -120,7 +180,7 @@ def preprocess_signature_repo_compat(
             end_idx = len(sequence)
             start_idx = end_idx - target_length
         sequence = sequence[start_idx:end_idx]
-        logger.info(f"Repo-compat step 2: Center crop applied: {len(original_sequence)} -> {len(sequence)}")
+        logger.debug("Repo-compat step 2: Center crop applied: %d -> %d", len(original_sequence), len(sequence))
 
     x = sequence[:, 0]
     y = sequence[:, 1]
@@ -131,21 +191,24 @@ def preprocess_signature_repo_compat(
         low = np.percentile(values, robust_percentile)
         high = np.percentile(values, 100 - robust_percentile)
         if high <= low:
-            return np.zeros_like(values, dtype=float)
+            return np.zeros_like(values, dtype=DTYPE)
         scaled = (values - low) / (high - low)
         return np.clip(scaled, 0.0, 1.0)
 
-    x_norm = _robust_scale(x)
-    y_norm = _robust_scale(y)
-
-    p_norm = np.clip(p.astype(float), 0.0, 1.0)
-
-    features = np.column_stack([x_norm, y_norm, t.astype(float), p_norm]).astype(float)
-
-    padded_features, mask = apply_padding_with_mask(features, target_length)
-    logger.info(
-        f"Repo-compat preprocessing complete: final shape={padded_features.shape}, valid_points={int(mask.sum())}"
-    )
+    # Las features se escriben directo en el array final float32 con padding
+    # (sin column_stack intermedio ni la copia de apply_padding_with_mask)
+    n = len(sequence)
+    padded_features = np.zeros((target_length, 4), dtype=DTYPE)
+    padded_features[:n, 0] = _robust_scale(x)
+    padded_features[:n, 1] = _robust_scale(y)
+    padded_features[:n, 2] = t
+    np.clip(p, 0.0, 1.0, out=padded_features[:n, 3])
+    mask = _padding_mask(n, target_length)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Repo-compat preprocessing complete: final shape=%s, valid_points=%d",
+            padded_features.shape, int(mask.sum()),
+        )
     return padded_features, mask
 
 
@@ -163,7 +226,7 @@ def generate_master_feature(list_of_signatures: List[Tuple[np.ndarray, np.ndarra
         Dict con los tensores promedio (mean) y desviación estándar (std) 
         como listas para fácil serialización a JSON.
     """
-    logger.info(f"Generando Feature Maestro a partir de {len(list_of_signatures)} firmas")
+    logger.info("Generando Feature Maestro a partir de %d firmas", len(list_of_signatures))
     
     # Extraer solo los tensores de características y validar forma
     features_only = []
@@ -185,7 +248,7 @@ def generate_master_feature(list_of_signatures: List[Tuple[np.ndarray, np.ndarra
     }
 
 
-def compute_dtw_medoid_raw(signatures: List[List]) -> Tuple[int, List[List[float]], List[List[float]]]:
+def compute_dtw_medoid_raw(signatures: List[Stroke]) -> Tuple[int, List[List[float]], List[List[float]]]:
     """
     Compute the most representative raw signature using DTW medoid.
 
@@ -196,7 +259,7 @@ def compute_dtw_medoid_raw(signatures: List[List]) -> Tuple[int, List[List[float
     original_trajectories: List[np.ndarray] = []
 
     for signature_points in signatures:
-        original_trajectory = np.array([[p.x, p.y] for p in signature_points], dtype=float)
+        original_trajectory = np.column_stack((signature_points.x, signature_points.y))
         if len(original_trajectory) < 2:
             raise ValueError("No valid trajectory points found for DTW medoid")
         original_trajectories.append(original_trajectory)
@@ -216,7 +279,7 @@ def compute_dtw_medoid_raw(signatures: List[List]) -> Tuple[int, List[List[float
     medoid_sequence = original_trajectories[medoid_index].tolist()
 
     logger.info(
-        f"DTW raw medoid selected: index={medoid_index}, average_distance={average_distances[medoid_index]:.4f}"
+        "DTW raw medoid selected: index=%d, average_distance=%.4f", medoid_index, average_distances[medoid_index]
     )
 
     return medoid_index, medoid_sequence, distance_matrix.tolist()
@@ -265,41 +328,40 @@ def dtw_distance_2d(sequence_a: np.ndarray, sequence_b: np.ndarray) -> float:
     return float(cost_matrix[len_a, len_b])
 
 
-def recover_original_sequence(stroke_points: List, real_length: int) -> np.ndarray:
+def recover_original_sequence(stroke_points: Stroke, real_length: int) -> np.ndarray:
     """
     Recuperar secuencia original eliminando el padding aplicado en apiContainer
     
     Args:
-        stroke_points: Puntos con posible padding
+        stroke_points: Trazo columnar con posible padding
         real_length: Longitud real original
         
     Returns:
         np.ndarray: Secuencia original (real_length, 4) [x, y, t, p]
     """
-    # Convertir a numpy array
-    sequence = np.array([
-        [p.x, p.y, p.t, p.p] for p in stroke_points
-    ])
-    
-    # Si la longitud coincide con real_length, no hay padding
-    if len(sequence) == real_length:
-        return sequence
-    
     # Si hay padding, tomar solo los primeros real_length puntos
-    # Asumiendo que el padding se aplicó al final
-    if len(sequence) > real_length:
-        return sequence[:real_length]
-    
-    # Si real_length > len(sequence), algo está mal
-    logger.warning(f"real_length ({real_length}) > actual length ({len(sequence)})")
+    # Asumiendo que el padding se aplicó al final (se recorta antes de
+    # copiar, así el padding nunca llega a la secuencia)
+    if len(stroke_points) > real_length:
+        stroke_points = stroke_points[:real_length]
+    elif len(stroke_points) < real_length:
+        # Si real_length > len(sequence), algo está mal
+        logger.warning("real_length (%d) > actual length (%d)", real_length, len(stroke_points))
+    
+    # Las columnas ya son arrays: se copian (con cast a DTYPE) a la matriz (n, 4)
+    sequence = np.empty((len(stroke_points), 4), dtype=DTYPE)
+    sequence[:, 0] = stroke_points.x
+    sequence[:, 1] = stroke_points.y
+    sequence[:, 2] = stroke_points.t
+    sequence[:, 3] = stroke_points.p
     return sequence
 
 
-def compute_basic_signature_features(stroke_points: List, duration_ms: int, real_length: int):
+def compute_basic_signature_features(stroke_points: Stroke, duration_ms: int, real_length: int):
     """Compute lightweight comparison features directly from a raw signature."""
-    if not stroke_points or len(stroke_points) < 2:
+    if len(stroke_points) < 2:
         return SimpleNamespace(
-            num_points=len(stroke_points) if stroke_points else 0,
+            num_points=len(stroke_points),
             real_length=real_length,
             total_distance=0.0,
             velocity_mean=0.0,
@@ -307,37 +369,25 @@ def compute_basic_signature_features(stroke_points: List, duration_ms: int, real
             duration_ms=duration_ms,
         )
 
-    total_distance = 0.0
-    velocities = []
-
-    for index in range(1, len(stroke_points)):
-        previous = stroke_points[index - 1]
-        current = stroke_points[index]
-
-        dx = current.x - previous.x
-        dy = current.y - previous.y
-        distance = math.sqrt(dx ** 2 + dy ** 2)
-        total_distance += distance
+    distances = np.hypot(np.diff(stroke_points.x), np.diff(stroke_points.y))
+    time_diff_ms = np.diff(stroke_points.t)
+    moving = time_diff_ms > 0
+    velocities = distances[moving] / (time_diff_ms[moving] / 1000.0)
 
-        time_diff_ms = current.t - previous.t
-        if time_diff_ms > 0:
-            time_diff_s = time_diff_ms / 1000.0
-            velocities.append(distance / time_diff_s)
-
-    velocity_mean = sum(velocities) / len(velocities) if velocities else 0.0
-    velocity_max = max(velocities) if velocities else 0.0
+    velocity_mean = float(velocities.mean()) if velocities.size else 0.0
+    velocity_max = float(velocities.max()) if velocities.size else 0.0
 
     return SimpleNamespace(
         num_points=len(stroke_points),
         real_length=real_length,
-        total_distance=round(total_distance, 2),
+        total_distance=round(float(distances.sum()), 2),
         velocity_mean=round(velocity_mean, 2),
         velocity_max=round(velocity_max, 2),
         duration_ms=duration_ms,
     )
 
 
-def resample_to_frequency(sequence: np.ndarray, target_freq: int = 100) -> np.ndarray:
+def resample_to_frequency(sequence: np.ndarray, target_freq: int = 100, out: np.ndarray | None = None) -> np.ndarray:
     """
     Resampling a frecuencia objetivo (100 Hz) con anti-aliasing
     
@@ -351,9 +401,10 @@ def resample_to_frequency(sequence: np.ndarray, target_freq: int = 100) -> np.nd
     Args:
         sequence: Array (n, 4) [x, y, t, p]
         target_freq: Frecuencia objetivo en Hz
+        out: Buffer opcional (>= 2000, 4) donde escribir el resultado
         
     Returns:
-        np.ndarray: Secuencia resampleada
+        np.ndarray: Secuencia resampleada (vista sobre `out` si se pasó)
     """
     n_points = len(sequence)
     
@@ -363,8 +414,9 @@ def resample_to_frequency(sequence: np.ndarray, target_freq: int = 100) -> np.nd
     # Timestamps originales (en milisegundos)
     t_original = sequence[:, 2]
     
-    # Duración total en segundos
-    duration_s = (t_original[-1] - t_original[0]) / 1000.0
+    # Duración total en segundos (escalar en float64: define n_target y con
+    # float32 int(duration_s * target_freq) podría variar en un punto)
+    duration_s = (float(t_original[-1]) - float(t_original[0])) / 1000.0
     
     if duration_s <= 0:
         logger.warning("Duration is zero or negative, returning original sequence")
@@ -377,31 +429,29 @@ def resample_to_frequency(sequence: np.ndarray, target_freq: int = 100) -> np.nd
     n_target = int(duration_s * target_freq)
     
     # Evitar muy pocos o muchos puntos
-    n_target = max(100, min(n_target, 2000))
+    n_target = max(100, min(n_target, _RESAMPLE_MAX_POINTS))
     
     # Crear timestamps uniformes
     t_uniform = np.linspace(t_original[0], t_original[-1], n_target)
     
     # Interpolar cada feature
-    resampled = np.zeros((n_target, 4))
+    resampled = np.empty((n_target, 4), dtype=DTYPE) if out is None else out[:n_target]
+    
+    # 🔥 ANTI-ALIASING: Si frecuencia original < 50 Hz (Nyquist para 100 Hz)
+    # filtra las 4 columnas (x, y, t, p) en una sola llamada con el SOS ya diseñado
+    filtered = sequence
+    if original_freq < 50 and n_points > 10:
+        try:
+            # Aplicar filtro pasa-bajas antes de interpolar
+            filtered = signal.sosfiltfilt(_ANTI_ALIASING_SOS, sequence[:, :4], axis=0)
+        except Exception as e:
+            logger.warning("Anti-aliasing filter failed: %s", e)
     
     for i in range(4):  # x, y, t, p
-        # 🔥 ANTI-ALIASING: Si frecuencia original < 50 Hz (Nyquist para 100 Hz)
-        if original_freq < 50 and n_points > 10:
-            try:
-                # Aplicar filtro pasa-bajas antes de interpolar
-                sos = signal.butter(4, 0.8, btype='low', output='sos')
-                filtered_data = signal.sosfiltfilt(sos, sequence[:, i])
-            except Exception as e:
-                logger.warning(f"Anti-aliasing filter failed for feature {i}: {str(e)}")
-                filtered_data = sequence[:, i]
-        else:
-            filtered_data = sequence[:, i]
-        
         # Interpolación lineal (óptima para señales biométricas)
-        resampled[:, i] = np.interp(t_uniform, t_original, filtered_data)
+        resampled[:, i] = np.interp(t_uniform, t_original, filtered[:, i])
     
-    logger.info(f"Resampled from {original_freq:.1f} Hz ({n_points} pts) to {target_freq} Hz ({n_target} pts)")
+    logger.debug("Resampled from %.1f Hz (%d pts) to %d Hz (%d pts)", original_freq, n_points, target_freq, n_target)
     
     return resampled
 
@@ -437,7 +487,7 @@ def smooth_coordinates(sequence: np.ndarray, window_length: int = 7, polyorder:
     return smoothed
 
 
-def extract_advanced_features(sequence: np.ndarray) -> np.ndarray:
+def extract_advanced_features(sequence: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
     """
     Extraer features avanzadas: velocidad, aceleración, ángulo, curvatura
     
@@ -453,89 +503,122 @@ def extract_advanced_features(sequence: np.ndarray) -> np.ndarray:
     
     Args:
         sequence: Array (n, 4) [x, y, t, p]
+        out: Buffer opcional (n, 8) donde escribir las features
         
     Returns:
         np.ndarray: Features (n, 8)
     """
     n = len(sequence)
-    features = np.zeros((n, 8))
     
+    # Cada feature se calcula como array 1-D contiguo (x, y, t, p son columnas
+    # con stride de la secuencia) y la matriz (n, 8) se escribe una sola vez al final
     x = sequence[:, 0]
     y = sequence[:, 1]
     t = sequence[:, 2]
     p = sequence[:, 3]
     
-    # Features 1-2: Coordenadas suavizadas
-    features[:, 0] = x
-    features[:, 1] = y
-    
     # Calcular dt (en segundos)
     dt = np.diff(t) / 1000.0  # milisegundos a segundos
     dt[dt == 0] = 0.001  # Evitar división por cero
     
     # Features 3-4: Velocidad con diferencias centrales
-    vx = np.zeros(n)
-    vy = np.zeros(n)
-    
-    # Diferencias centrales (interior)
-    for i in range(1, n - 1):
-        dt_avg = (dt[i-1] + dt[i]) / 2.0
-        vx[i] = (x[i+1] - x[i-1]) / (2 * dt_avg) if dt_avg > 0 else 0
-        vy[i] = (y[i+1] - y[i-1]) / (2 * dt_avg) if dt_avg > 0 else 0
+    vx = _central_difference(x, dt)
+    vy = _central_difference(y, dt)
     
-    # Bordes: diferencias hacia adelante/atrás
-    if n > 1:
-        vx[0] = (x[1] - x[0]) / dt[0] if dt[0] > 0 else 0
-        vy[0] = (y[1] - y[0]) / dt[0] if dt[0] > 0 else 0
-        vx[-1] = (x[-1] - x[-2]) / dt[-1] if dt[-1] > 0 else 0
-        vy[-1] = (y[-1] - y[-2]) / dt[-1] if dt[-1] > 0 else 0
-    
-    features[:, 2] = vx
-    features[:, 3] = vy
+    # vx^2 + vy^2 se calcula una vez y sirve para la magnitud y la curvatura;
+    # los pasos siguientes escriben en buffers ya asignados (out=) en lugar de
+    # crear un temporal por operación
+    scratch = np.empty(n, dtype=DTYPE)
+    speed_sq = np.multiply(vx, vx)
+    speed_sq += np.multiply(vy, vy, out=scratch)
     
-    # Feature 5: Magnitud de velocidad
-    v_magnitude = np.sqrt(vx**2 + vy**2)
-    features[:, 4] = v_magnitude
+    # Feature 5: Magnitud de velocidad (sqrt de speed_sq: en float32 es más
+    # rápido que np.hypot, que escala para evitar overflow)
+    v_magnitude = np.sqrt(speed_sq)
     
-    # Feature 6: Ángulo unwrap
-    theta = np.arctan2(vy, vx)
-    theta_unwrap = np.unwrap(theta)  # Unwrap para continuidad
-    features[:, 5] = theta_unwrap
+    # Feature 6: Ángulo unwrap (continuidad)
+    theta = _unwrap_angles(np.arctan2(vy, vx))
     
     # Feature 7: Curvatura
     # Curvatura = |vx*ay - vy*ax| / (vx^2 + vy^2)^(3/2)
-    ax = np.zeros(n)
-    ay = np.zeros(n)
-    
     # Aceleración con diferencias centrales
-    for i in range(1, n - 1):
-        dt_avg = (dt[i-1] + dt[i]) / 2.0
-        ax[i] = (vx[i+1] - vx[i-1]) / (2 * dt_avg) if dt_avg > 0 else 0
-        ay[i] = (vy[i+1] - vy[i-1]) / (2 * dt_avg) if dt_avg > 0 else 0
-    
-    # Bordes
-    if n > 1:
-        ax[0] = (vx[1] - vx[0]) / dt[0] if dt[0] > 0 else 0
-        ay[0] = (vy[1] - vy[0]) / dt[0] if dt[0] > 0 else 0
-        ax[-1] = (vx[-1] - vx[-2]) / dt[-1] if dt[-1] > 0 else 0
-        ay[-1] = (vy[-1] - vy[-2]) / dt[-1] if dt[-1] > 0 else 0
-    
-    # Curvatura
-    numerator = np.abs(vx * ay - vy * ax)
-    denominator = (vx**2 + vy**2)**(3/2)
-    denominator[denominator == 0] = 1e-10  # Evitar división por cero
-    curvature = numerator / denominator
+    ax = _central_difference(vx, dt)
+    ay = _central_difference(vy, dt)
+    
+    # Curvatura (numerador y denominador en sitio)
+    # (vx^2 + vy^2)^(3/2) = speed_sq * v_magnitude, sin pasar por np.power
+    curvature = np.multiply(vx, ay)
+    curvature -= np.multiply(vy, ax, out=scratch)
+    np.abs(curvature, out=curvature)
+    denominator = np.multiply(speed_sq, v_magnitude, out=speed_sq)
+    # Velocidad nula: vx = vy = 0 anula el numerador, la curvatura queda en 0
+    np.divide(curvature, denominator, out=curvature, where=denominator != 0)
     
     # Clip curvatura a rango razonable
-    curvature_clip = np.clip(curvature, -10, 10)
-    features[:, 6] = curvature_clip
+    np.clip(curvature, -10, 10, out=curvature)
     
-    # Feature 8: Presión
-    features[:, 7] = p
+    # Features 1-8: x, y, vx, vy, v_mag, theta, curvature, pressure
+    features = np.empty((n, 8), dtype=DTYPE) if out is None else out
+    np.stack((x, y, vx, vy, v_magnitude, theta, curvature, p), axis=1, out=features)
     
     return features
 
 
+def _central_difference(values: np.ndarray, dt: np.ndarray) -> np.ndarray:
+    """
+    Derivada con diferencias centrales en el interior y hacia adelante/atrás en
+    los bordes; 0 donde el intervalo de tiempo no es positivo
+    
+    Args:
+        values: Array (n,)
+        dt: Intervalos de tiempo en segundos (n-1,)
+        
+    Returns:
+        np.ndarray: Derivada (n,)
+    """
+    n = len(values)
+    derivative = np.zeros(n, dtype=DTYPE)
+    if n < 2:
+        return derivative
+    
+    # Interior: (v[i+1] - v[i-1]) / (2 * dt_avg), con 2 * dt_avg = dt[i-1] + dt[i]
+    span = dt[:-1] + dt[1:]
+    np.divide(values[2:] - values[:-2], span, out=derivative[1:-1], where=span > 0)
+    
+    # Bordes: diferencias hacia adelante/atrás
+    if dt[0] > 0:
+        derivative[0] = (values[1] - values[0]) / dt[0]
+    if dt[-1] > 0:
+        derivative[-1] = (values[-1] - values[-2]) / dt[-1]
+    
+    return derivative
+
+
+def _unwrap_angles(theta: np.ndarray) -> np.ndarray:
+    """
+    Unwrap en sitio de ángulos en (-π, π] (salida de arctan2)
+    
+    Equivale a np.unwrap para este rango: cada salto mayor a π suma o resta
+    2π. Los saltos se acumulan como enteros y se multiplican por 2π una sola
+    vez, sin los temporales de mod/where de np.unwrap y con menos error de
+    redondeo acumulado en float32.
+    
+    Args:
+        theta: Array (n,) de ángulos, se modifica en sitio
+        
+    Returns:
+        np.ndarray: theta unwrapped (el mismo array)
+    """
+    if len(theta) < 2:
+        return theta
+    
+    jumps = np.diff(theta)
+    turns = (jumps < -np.pi).astype(np.int32)
+    turns -= jumps > np.pi
+    theta[1:] += np.cumsum(turns, out=turns) * theta.dtype.type(2 * np.pi)
+    return theta
+
+
 def normalize_features(features: np.ndarray) -> np.ndarray:
     """
     Normalización por feature según el tipo:
@@ -552,28 +635,26 @@ def normalize_features(features: np.ndarray) -> np.ndarray:
     """
     normalized = features.copy()
     
-    # Features 0-1: x, y - Min-Max a [0, 1]
-    for i in [0, 1]:
-        min_val = features[:, i].min()
-        max_val = features[:, i].max()
-        if max_val > min_val:
-            normalized[:, i] = (features[:, i] - min_val) / (max_val - min_val)
-    
-    # Features 2-4, 6: vx, vy, v_magnitude, curvature - Z-score
-    for i in [2, 3, 4, 6]:
-        mean_val = features[:, i].mean()
-        std_val = features[:, i].std()
-        if std_val > 0:
-            normalized[:, i] = (features[:, i] - mean_val) / std_val
-    
-    # Feature 5: theta_unwrap - Z-score (NO dividir por π)
-    # theta_unwrap puede estar en cualquier rango después del unwrap (±10π, ±20π, etc.)
-    # Mejor usar Z-score para normalizar como las otras features dinámicas
-    theta_mean = features[:, 5].mean()
-    theta_std = features[:, 5].std()
-    if theta_std > 0:
-        normalized[:, 5] = (features[:, 5] - theta_mean) / theta_std
-    else:
+    # Features 0-1: x, y - Min-Max a [0, 1] (columna constante: se deja igual)
+    coords = features[:, 0:2]
+    min_val = coords.min(axis=0)
+    max_val = coords.max(axis=0)
+    value_range = max_val - min_val
+    scalable = max_val > min_val
+    np.divide(coords - min_val, value_range, out=normalized[:, 0:2], where=scalable)
+    
+    # Features 2-6: vx, vy, v_magnitude, theta_unwrap, curvature - Z-score
+    # theta_unwrap puede estar en cualquier rango después del unwrap (±10π, ±20π, etc.):
+    # se normaliza con Z-score como las otras features dinámicas (NO dividir por π)
+    # Las reducciones van sobre filas contiguas (5, n): misma suma por pares que
+    # columna a columna, así que mean/std no cambian respecto al cálculo 1-D
+    dynamic = np.ascontiguousarray(features[:, 2:7].T)
+    mean_val = dynamic.mean(axis=1, keepdims=True)
+    std_val = dynamic.std(axis=1, keepdims=True)
+    np.divide(dynamic - mean_val, std_val, out=normalized[:, 2:7].T, where=std_val > 0)
+    
+    # theta constante va a 0; el resto de columnas constantes se dejan igual
+    if not std_val[3, 0] > 0:
         normalized[:, 5] = 0.0
     
     # Feature 7: pressure - Ya está en [0, 1], no hacer nada
@@ -587,27 +668,32 @@ def validate_normalization(features: np.ndarray):
     Validar que la normalización se hizo correctamente
     Lanza excepción si hay problemas
     
+    NaN/Inf se revisa siempre (una sola pasada con isfinite); los rangos de
+    tolerancia son chequeos de desarrollo y solo corren con DEBUG=true
+    
     Args:
         features: Array (n, 8) normalizado
     """
+    # Sin NaN/Inf: explícito (no assert) para que siga activo con python -O
+    if not np.isfinite(features).all():
+        raise ValueError("Features contain NaN or Inf")
+    
+    if not _CHECK_NORMALIZATION_BOUNDS:
+        return
+    
     # Coordenadas en [0, 1] (con margen de tolerancia)
     assert features[:, :2].min() >= -0.01, f"x/y min too low: {features[:, :2].min()}"
     assert features[:, :2].max() <= 1.01, f"x/y max too high: {features[:, :2].max()}"
     
     # Z-score features (vx, vy, v_mag, theta_unwrap, curvature): ~95% en [-3, 3]
-    z_features = features[:, [2, 3, 4, 5, 6]]
-    z_mean = np.abs(z_features).mean()
+    z_mean = np.abs(features[:, 2:7]).mean()
     assert z_mean < 2.5, f"Z-score mean too high: {z_mean}"
     
     # Presión en [0, 1]
     assert features[:, 7].min() >= -0.01, f"pressure min too low: {features[:, 7].min()}"
     assert features[:, 7].max() <= 1.01, f"pressure max too high: {features[:, 7].max()}"
     
-    # Sin NaN/Inf
-    assert not np.any(np.isnan(features)), "Features contain NaN"
-    assert not np.any(np.isinf(features)), "Features contain Inf"
-    
-    logger.info("✓ Normalization validation passed")
+    logger.debug("✓ Normalization validation passed")
 
 
 def intelligent_truncate(sequence: np.ndarray, target: int = 400) -> Tuple[np.ndarray, List[int]]:
@@ -660,7 +746,7 @@ def intelligent_truncate(sequence: np.ndarray, target: int = 400) -> Tuple[np.nd
         truncated = valid[start_idx:end_idx]
         indices = list(range(warmup_end + start_idx, warmup_end + end_idx))
         
-        logger.info(f"Truncated {n} -> {len(truncated)} (removed warm-up: {warmup_end}, lifting: {n-lifting_start})")
+        logger.debug("Truncated %d -> %d (removed warm-up: %d, lifting: %d)", n, len(truncated), warmup_end, n - lifting_start)
         return truncated, indices
     
     indices = list(range(warmup_end, lifting_start))
@@ -679,19 +765,30 @@ def apply_padding_with_mask(sequence: np.ndarray, target_length: int = 400) -> T
         Tuple[np.ndarray, np.ndarray]:
             - Secuencia con padding (target_length, 8)
             - Máscara (target_length,): 1 para reales, 0 para padding
+              (de solo lectura para target_length=400)
     """
     n = len(sequence)
     
     if n >= target_length:
-        return sequence[:target_length], np.ones(target_length)
+        return sequence[:target_length], _padding_mask(target_length, target_length)
     
-    # Crear array con padding de zeros
-    padded = np.zeros((target_length, sequence.shape[1]))
+    # Crear array con padding de zeros (np.zeros sale de memoria ya en cero:
+    # más barato que np.empty + rellenar solo la cola)
+    padded = np.zeros((target_length, sequence.shape[1]), dtype=DTYPE)
     padded[:n] = sequence
     
-    # Crear máscara: 1 para puntos reales, 0 para padding
-    mask = np.zeros(target_length)
-    mask[:n] = 1
+    # Máscara: 1 para puntos reales, 0 para padding
+    mask = _padding_mask(n, target_length)
     
-    logger.info(f"Applied padding: {n} -> {target_length} points")
+    logger.debug("Applied padding: %d -> %d points", n, target_length)
     return padded, mask
+
+
+def _padding_mask(n: int, target_length: int) -> np.ndarray:
+    """Máscara (target_length,) con 1 en los primeros n puntos y 0 en el resto"""
+    if target_length == _MASK_TEMPLATE_LENGTH:
+        return _MASK_TEMPLATE[target_length - n:2 * target_length - n]
+    
+    mask = np.zeros(target_length, dtype=DTYPE)
+    mask[:n] = 1
+    return mask
@@ -1,23 +1,32 @@
 """
 API routes for biometric validation
 """
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
 from typing import Dict, Any
-from types import SimpleNamespace
 import numpy as np
 from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 
+from app import __version__
 from app.config import settings
-from app.models import BiometricRequest, BiometricResponse, HealthResponse, EnrollmentCloudRequest, MasterFeatureResponse, StepUpBiometricRequest
+from app.models import BiometricRequest, BiometricResponse, HealthResponse, EnrollmentCloudRequest, MasterFeatureResponse, StepUpBiometricRequest, Stroke
 from app.auth import verify_credentials
-from app.model_loader import compute_embedding
+from app.serialization import ORJSONRoute
 from app.utils import (
     RateLimiter, 
     get_client_ip, 
     validate_stroke_points
 )
-from app.preprocessing import preprocess_signature, preprocess_signature_repo_compat, compute_dtw_medoid_raw, compute_basic_signature_features
+from app.preprocessing import (
+    SignatureTooLargeError,
+    preprocess_signature,
+    preprocess_signature_repo_compat,
+    compute_dtw_medoid_raw,
+    compute_basic_signature_features,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -25,33 +34,55 @@ MIN_STROKE_POINTS = settings.min_stroke_points
 MAX_STROKE_POINTS = settings.max_stroke_points
 
 # Initialize router
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 # Initialize rate limiter from environment-backed settings
 rate_limiter = RateLimiter(
     max_requests=settings.rate_limit_requests,
     window_seconds=settings.rate_limit_window_seconds,
+    redis_url=settings.rate_limit_redis_url or None,
+    algorithm=settings.rate_limit_algorithm,
 )
 
-# Global variable to track model status (will be updated when model loads)
-model_loaded = False
+# Respuestas de /health ya armadas (lo consultan los balanceadores con frecuencia)
+_HEALTH_RESPONSES = {
+    loaded: HealthResponse(status="healthy", version=__version__, model_loaded=loaded)
+    for loaded in (False, True)
+}
+
+# LRU de respuestas de validación por hash del body crudo (opt-in). Un payload
+# byte a byte idéntico (reintentos, clientes idempotentes) no vuelve a pasar por
+# preprocesamiento + LSTM; se cachean resultados válidos e inválidos, nunca errores.
+VALIDATION_CACHE_ENABLED = settings.validation_cache_enabled
+VALIDATION_CACHE_MAX_ENTRIES = settings.validation_cache_max_entries
+_validation_cache: "OrderedDict[bytes, BiometricResponse]" = OrderedDict()
+
+
+def _validation_cache_get(key: bytes):
+    response = _validation_cache.get(key)
+    if response is not None:
+        _validation_cache.move_to_end(key)
+    return response
+
+
+def _validation_cache_put(key: bytes, response: BiometricResponse) -> None:
+    _validation_cache[key] = response
+    _validation_cache.move_to_end(key)
+    while len(_validation_cache) > VALIDATION_CACHE_MAX_ENTRIES:
+        _validation_cache.popitem(last=False)
 
 
 @router.get("/health", response_model=HealthResponse)
-async def health_check():
+async def health_check(request: Request):
     """
     Health check endpoint
     
     Returns:
         HealthResponse: Service health status
     """
-    from app import __version__
-    
-    return HealthResponse(
-        status="healthy",
-        version=__version__,
-        model_loaded=model_loaded
-    )
+    # main.py guarda el intérprete en app.state al cargar el modelo
+    loaded = getattr(request.app.state, "ml_model", None) is not None
+    return _HEALTH_RESPONSES[loaded]
 
 
 @router.post("/api/biometric/validate", response_model=BiometricResponse)
@@ -66,13 +97,22 @@ async def validate_biometric(
     client_ip = get_client_ip(request)
     logger.info(f"Received validation request from {client_ip}")
 
-    if not rate_limiter.check_rate_limit(client_ip):
+    if not await rate_limiter.check_rate_limit(client_ip):
         logger.warning(f"Rate limit exceeded for IP: {client_ip}")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded: max 20 requests per minute"
         )
 
+    cache_key = None
+    if VALIDATION_CACHE_ENABLED:
+        # FastAPI ya leyó el body para validar el payload: request.body() no relee
+        cache_key = hashlib.blake2b(await request.body(), digest_size=16).digest()
+        cached_response = _validation_cache_get(cache_key)
+        if cached_response is not None:
+            logger.info(f"Validation cache hit for {client_ip}")
+            return cached_response
+
     try:
         stroke_points = payload.stroke_points
         is_valid, error_msg = validate_stroke_points(
@@ -104,17 +144,6 @@ async def validate_biometric(
         )
         reference_template = payload.reference_template or {}
 
-        print("=" * 80)
-        print("📥 DATOS RECIBIDOS DESDE public gateway")
-        print("=" * 80)
-        print(f"  📊 Puntos crudos: {len(stroke_points)}")
-        print(f"  📏 Longitud real (sin padding): {payload.real_length}")
-        print(f"  📐 Distancia total: {basic_features.total_distance:.2f} px")
-        print(f"  🏃 Velocidad promedio: {basic_features.velocity_mean:.2f} px/ms")
-        print(f"  ⚡ Velocidad máxima: {basic_features.velocity_max:.2f} px/ms")
-        print(f"  ⏱️  Duración: {basic_features.duration_ms} ms")
-        print("-" * 80)
-
         logger.info(
             f"Processing stroke: {len(stroke_points)} points (real: {payload.real_length}), "
             f"distance={basic_features.total_distance}, "
@@ -134,7 +163,9 @@ async def validate_biometric(
                         settings.preprocessing_profile,
                         settings.model_features_per_point,
                     )
-                features_array, mask = preprocess_signature_repo_compat(
+                # Pipeline NumPy/SciPy en el threadpool: no bloquea el event loop
+                features_array, mask = await run_in_threadpool(
+                    preprocess_signature_repo_compat,
                     stroke_points=stroke_points,
                     real_length=payload.real_length,
                     target_length=400,
@@ -142,7 +173,8 @@ async def validate_biometric(
                 )
                 feature_label = "[x, y, t, p]"
             else:
-                features_array, mask = preprocess_signature(
+                features_array, mask = await run_in_threadpool(
+                    preprocess_signature,
                     stroke_points=stroke_points,
                     real_length=payload.real_length,
                     target_frequency=100,
@@ -151,18 +183,24 @@ async def validate_biometric(
                 feature_label = "[x, y, vx, vy, v_mag, theta, curvature, pressure]"
 
             valid_points = int(mask.sum())
-            padded_points = int((1 - mask).sum())
-
-            print("✅ PREPROCESAMIENTO COMPLETADO")
-            print(f"  🎯 Shape final: {features_array.shape}")
-            print(f"  ✔️  Puntos válidos: {valid_points}")
-            print(f"  ➕ Puntos con padding: {padded_points}")
-            print(f"  📊 Features: {feature_label}")
-            print(f"  🎭 Máscara aplicada: {mask.sum()}/{len(mask)} puntos reales")
-            print("=" * 80)
-            print()
-
-            logger.info(f"Preprocessing complete: features shape={features_array.shape}, mask sum={mask.sum()}")
+            padded_points = len(mask) - valid_points
+
+            logger.debug(
+                "Preprocessing complete: features shape=%s, valid_points=%d, padded_points=%d, features=%s, "
+                "velocity_max=%.2f, duration_ms=%s",
+                features_array.shape,
+                valid_points,
+                padded_points,
+                feature_label,
+                basic_features.velocity_max,
+                basic_features.duration_ms,
+            )
+        except SignatureTooLargeError as e:
+            logger.warning(f"Preprocessing skipped: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e)
+            )
         except ValueError as e:
             logger.error(f"Preprocessing failed: {str(e)}")
             raise HTTPException(
@@ -170,15 +208,15 @@ async def validate_biometric(
                 detail=f"Preprocessing error: {str(e)}"
             )
 
-        ml_model = getattr(getattr(request.app, "state", None), "ml_model", None)
+        inference_worker = getattr(getattr(request.app, "state", None), "inference_worker", None)
 
-        is_signature_valid, confidence_score, comparison_details = _validate_against_reference(
+        is_signature_valid, confidence_score, comparison_details = await _validate_against_reference(
             stroke_points,
             reference_template,
             basic_features,
-            float(mask.sum()),
+            float(valid_points),
             preprocessed_signature=features_array,
-            ml_model=ml_model,
+            inference_worker=inference_worker,
         )
 
         response = BiometricResponse(
@@ -195,18 +233,20 @@ async def validate_biometric(
                     "stroke_overlap"
                 ],
                 "matched_user": reference_template.get("user_id") if is_signature_valid else None,
-                "num_points_processed": int(mask.sum()),
+                "num_points_processed": valid_points,
                 "comparison": comparison_details,
                 "preprocessing": {
                     "real_length": payload.real_length,
                     "after_preprocessing": features_array.shape[0],
-                    "valid_points": int(mask.sum()),
-                    "padded_points": int((1 - mask).sum())
+                    "valid_points": valid_points,
+                    "padded_points": padded_points
                 }
             }
         )
 
         logger.info(f"Validation complete: valid={is_signature_valid}, confidence={confidence_score}")
+        if cache_key is not None:
+            _validation_cache_put(cache_key, response)
         return response
 
     except HTTPException:
@@ -224,7 +264,7 @@ def _build_reference_stroke(reference_template):
     if not dtw_medoid:
         return None
 
-    reference_points = []
+    xs, ys, ts = [], [], []
     for index, point in enumerate(dtw_medoid):
         if isinstance(point, dict):
             x_value = point.get("x")
@@ -237,20 +277,23 @@ def _build_reference_stroke(reference_template):
         if x_value is None or y_value is None:
             continue
 
-        reference_points.append(
-            SimpleNamespace(
-                x=float(x_value),
-                y=float(y_value),
-                t=index * 10,
-                p=0.5,
-            )
-        )
+        xs.append(float(x_value))
+        ys.append(float(y_value))
+        ts.append(index * 10)
 
-    return reference_points or None
+    if not xs:
+        return None
+
+    return Stroke(
+        x=np.array(xs, dtype=np.float64),
+        y=np.array(ys, dtype=np.float64),
+        t=np.array(ts, dtype=np.int64),
+        p=np.full(len(xs), 0.5),
+    )
 
 
-def _compute_lstm_similarity(preprocessed_signature, reference_template, ml_model):
-    if ml_model is None or preprocessed_signature is None:
+async def _compute_lstm_similarity(preprocessed_signature, reference_template, inference_worker):
+    if inference_worker is None or preprocessed_signature is None:
         return None
 
     reference_stroke = _build_reference_stroke(reference_template)
@@ -258,15 +301,19 @@ def _compute_lstm_similarity(preprocessed_signature, reference_template, ml_mode
         return None
 
     try:
-        reference_features, _ = preprocess_signature_repo_compat(
+        reference_features, _ = await run_in_threadpool(
+            preprocess_signature_repo_compat,
             stroke_points=reference_stroke,
             real_length=len(reference_stroke),
             target_length=400,
             robust_percentile=10,
         )
 
-        live_embedding = compute_embedding(ml_model, preprocessed_signature)
-        reference_embedding = compute_embedding(ml_model, reference_features)
+        # Ambas firmas entran a la cola juntas: mismo batch del InferenceWorker
+        live_embedding, reference_embedding = await asyncio.gather(
+            inference_worker.submit(preprocessed_signature),
+            inference_worker.submit(reference_features),
+        )
 
         denominator = float(np.linalg.norm(live_embedding) * np.linalg.norm(reference_embedding))
         if denominator <= 0.0:
@@ -279,7 +326,7 @@ def _compute_lstm_similarity(preprocessed_signature, reference_template, ml_mode
         return None
 
 
-def _validate_against_reference(normalized_stroke, reference_template, features, valid_points, preprocessed_signature=None, ml_model=None):
+async def _validate_against_reference(normalized_stroke, reference_template, features, valid_points, preprocessed_signature=None, inference_worker=None):
     def _resolve_dtw_medoid(template):
         if not isinstance(template, dict):
             return None
@@ -304,7 +351,7 @@ def _validate_against_reference(normalized_stroke, reference_template, features,
             "valid_points": valid_points
         }
 
-    captured_xy = np.array([[p.x, p.y] for p in normalized_stroke], dtype=float)
+    captured_xy = np.column_stack((normalized_stroke.x, normalized_stroke.y))
     reference_xy = np.array([[point[0], point[1]] for point in dtw_medoid], dtype=float)
 
     min_length = min(len(captured_xy), len(reference_xy))
@@ -325,7 +372,7 @@ def _validate_against_reference(normalized_stroke, reference_template, features,
     score = max(0.0, 1.0 - (mean_distance / threshold))
 
     pressure_bonus = 0.05 if 0.0 <= getattr(features, "velocity_mean", 0.0) <= 20.0 else 0.0
-    lstm_similarity = _compute_lstm_similarity(preprocessed_signature, reference_template, ml_model)
+    lstm_similarity = await _compute_lstm_similarity(preprocessed_signature, reference_template, inference_worker)
     lstm_threshold = settings.lstm_similarity_threshold
     lstm_valid = lstm_similarity is None or lstm_similarity >= lstm_threshold
 
@@ -363,7 +410,7 @@ async def enroll_biometric(
     logger.info(f"Enrollment signatures received: {len(payload.signatures)}")
 
     # Validar limitación de tasa
-    if not rate_limiter.check_rate_limit(client_ip):
+    if not await rate_limiter.check_rate_limit(client_ip):
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Rate limit exceeded"
@@ -387,9 +434,7 @@ async def enroll_biometric(
 
             raw_signatures.append(sig.stroke_points)
             
-        print("=" * 80)
-        print("✅ TODAS LAS 5 FIRMAS VALIDADAS CORRECTAMENTE PARA ENROLAMIENTO")
-        print("=" * 80)
+        logger.info("Enrollment: all %d signatures validated", len(raw_signatures))
 
         medoid_index, medoid_sequence, pairwise_distances = compute_dtw_medoid_raw(raw_signatures)
 
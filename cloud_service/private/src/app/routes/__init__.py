@@ -19,5 +19,6 @@ def _load_legacy_module(module_name: str, filename: str):
 _legacy = _load_legacy_module("routes_legacy", "routes.py")
 
 router = _legacy.router
+rate_limiter = _legacy.rate_limiter
 
-__all__ = ["router"]
+__all__ = ["router", "rate_limiter"]
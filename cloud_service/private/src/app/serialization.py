@@ -0,0 +1,36 @@
+"""
+JSON Serialization - orjson en lugar de json de la stdlib
+
+FastAPI decodifica los bodies con json.loads; ORJSONRoute sustituye ese paso
+por orjson.loads (varias veces más rápido para los ~1200 puntos de un trazo,
+más el dtw_medoid del reference_template). La validación sigue siendo la de
+los modelos pydantic (StrokeArray columnar). Las respuestas usan ORJSONResponse
+como clase por defecto (ver main.py).
+"""
+from typing import Any, Callable, Coroutine
+import orjson
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+
+
+class ORJSONRequest(Request):
+    """Request cuyo .json() decodifica el body con orjson"""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError hereda de json.JSONDecodeError, así que
+            # FastAPI sigue respondiendo 422 "JSON decode error" ante bodies inválidos
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    """APIRoute que entrega ORJSONRequest a los endpoints"""
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        original_route_handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request) -> Response:
+            return await original_route_handler(ORJSONRequest(request.scope, request.receive))
+
+        return orjson_route_handler
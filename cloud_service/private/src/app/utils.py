@@ -1,35 +1,114 @@
 """
 Utility functions for rate limiting, validation, and padding
 """
+import asyncio
+import secrets
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 from typing import List, Dict, Tuple
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Request, status
 import logging
+import numpy as np
+
+from app.config import settings
+from app.models import Stroke
 
 logger = logging.getLogger(__name__)
 
+# Headers de proxy en el formato crudo del scope ASGI (nombres en minúsculas)
+_X_FORWARDED_FOR = b"x-forwarded-for"
+_X_REAL_IP = b"x-real-ip"
+TRUST_PROXY_HEADERS = settings.trust_proxy_headers
+
+try:
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import RedisError
+except ImportError:
+    redis_asyncio = None
+    RedisError = OSError
+
+# Ventana deslizante en un sorted set por IP (score = timestamp en ms). Limpieza,
+# conteo e inserción en un solo round trip atómico, compartido entre workers
+_SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return 1
+end
+return 0
+"""
+
+# Ventana fija: un contador por IP y bucket (now // window), un solo INCR.
+# Memoria constante por IP; admite hasta 2x ráfaga en el borde entre buckets
+_FIXED_WINDOW_SCRIPT = """
+local count = redis.call('INCR', KEYS[1])
+if count == 1 then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return count
+"""
+
+RATE_LIMIT_ALGORITHMS = ("sliding", "fixed")
+
 
 class RateLimiter:
     """
     Rate limiter using sliding window algorithm
     Tracks requests per IP address
+    
+    algorithm="fixed" cambia la ventana deslizante por un contador por ventana
+    fija (un entero por IP en lugar de un timestamp por request).
+    
+    Con redis_url la ventana vive en Redis (script Lua atómico), así el límite
+    es el mismo para todos los workers/réplicas. Sin Redis, o si Redis falla,
+    se usa la ventana en memoria del proceso.
     """
-    def __init__(self, max_requests: int = 20, window_seconds: int = 60):
+    def __init__(
+        self,
+        max_requests: int = 20,
+        window_seconds: int = 60,
+        redis_url: str | None = None,
+        algorithm: str = "sliding",
+    ):
         """
         Initialize rate limiter
         
         Args:
             max_requests: Maximum requests allowed in window
             window_seconds: Time window in seconds
+            redis_url: Optional Redis URL (redis://host:6379/0) for a shared window
+            algorithm: "sliding" (exact rolling window) or "fixed" (counter per window)
         """
+        if algorithm not in RATE_LIMIT_ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm} (expected one of {RATE_LIMIT_ALGORITHMS})")
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        # Dictionary to store request timestamps per IP
-        self.requests: Dict[str, List[float]] = defaultdict(list)
+        # Ventana en memoria con reloj monotónico en ns (enteros, inmune a ajustes del reloj)
+        self.window_ns = window_seconds * 1_000_000_000
+        self.algorithm = algorithm
+        # Timestamps (monotonic ns) per IP (sliding), del más viejo al más nuevo; nunca más de max_requests
+        self.requests: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.max_requests))
+        # IP -> [bucket, count] (fixed)
+        self._buckets: Dict[str, List[int]] = {}
+        self._cleanup_task = None
+        
+        self._redis = None
+        self._redis_script = None
+        if redis_url:
+            if redis_asyncio is None:
+                logger.warning("RATE_LIMIT_REDIS_URL is set but redis is not installed; using in-memory rate limiting")
+            else:
+                # Timeouts cortos: si Redis no responde se cae a la ventana local
+                self._redis = redis_asyncio.from_url(redis_url, socket_timeout=0.5, socket_connect_timeout=0.5)
+                self._redis_script = self._redis.register_script(
+                    _FIXED_WINDOW_SCRIPT if algorithm == "fixed" else _SLIDING_WINDOW_SCRIPT
+                )
         
-    def check_rate_limit(self, client_ip: str) -> bool:
+    async def check_rate_limit(self, client_ip: str) -> bool:
         """
         Check if client has exceeded rate limit
         
@@ -39,42 +118,113 @@ class RateLimiter:
         Returns:
             bool: True if within limit, False if exceeded
         """
-        current_time = time.time()
-        window_start = current_time - self.window_seconds
+        if self._redis_script is not None:
+            try:
+                allowed = await self._check_redis(client_ip)
+            except RedisError as e:
+                logger.warning("Redis rate limiter unavailable, using in-memory window: %s", e)
+            else:
+                if not allowed:
+                    logger.warning("Rate limit exceeded for IP: %s", client_ip)
+                return allowed
+        
+        if self.algorithm == "fixed":
+            return self._check_local_fixed(client_ip)
+        return self._check_local(client_ip)
+    
+    async def _check_redis(self, client_ip: str) -> bool:
+        # Reloj de pared: los timestamps se comparten entre procesos/hosts
+        now_ms = time.time_ns() // 1_000_000
+        window_ms = self.window_seconds * 1000
+        if self.algorithm == "fixed":
+            count = await self._redis_script(
+                keys=[f"rate_limit:{client_ip}:{now_ms // window_ms}"],
+                args=[window_ms],
+            )
+            return count <= self.max_requests
+        
+        # Miembro único: dos requests en el mismo ms cuentan por separado
+        member = f"{now_ms}:{secrets.token_hex(4)}"
+        allowed = await self._redis_script(
+            keys=[f"rate_limit:{client_ip}"],
+            args=[now_ms, window_ms, self.max_requests, member],
+        )
+        return allowed == 1
+    
+    def _check_local(self, client_ip: str) -> bool:
+        current_time = time.monotonic_ns()
+        window_start = current_time - self.window_ns
         
         # Get requests for this IP
         ip_requests = self.requests[client_ip]
         
-        # Remove old requests outside the window
-        ip_requests[:] = [req_time for req_time in ip_requests if req_time > window_start]
+        # Remove old requests outside the window (solo los expirados, por la izquierda)
+        while ip_requests and ip_requests[0] <= window_start:
+            ip_requests.popleft()
         
         # Check if limit exceeded
         if len(ip_requests) >= self.max_requests:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}")
+            logger.warning("Rate limit exceeded for IP: %s", client_ip)
             return False
         
         # Add current request
         ip_requests.append(current_time)
         return True
     
+    def _check_local_fixed(self, client_ip: str) -> bool:
+        bucket = time.monotonic_ns() // self.window_ns
+        entry = self._buckets.get(client_ip)
+        if entry is None or entry[0] != bucket:
+            self._buckets[client_ip] = [bucket, 1]
+            return True
+        
+        entry[1] += 1
+        if entry[1] > self.max_requests:
+            logger.warning("Rate limit exceeded for IP: %s", client_ip)
+            return False
+        return True
+    
     def cleanup_old_entries(self):
         """Remove IPs that have no recent requests"""
-        current_time = time.time()
-        window_start = current_time - (self.window_seconds * 2)
+        current_time = time.monotonic_ns()
+        window_start = current_time - self.window_ns
         
-        # Remove IPs with no recent requests
+        # Remove IPs whose newest request is already outside the window
         ips_to_remove = [
             ip for ip, requests in self.requests.items()
-            if not requests or max(requests, default=0) < window_start
+            if not requests or requests[-1] <= window_start
         ]
         
         for ip in ips_to_remove:
             del self.requests[ip]
+        
+        current_bucket = current_time // self.window_ns
+        for ip in [ip for ip, (bucket, _) in self._buckets.items() if bucket != current_bucket]:
+            del self._buckets[ip]
+    
+    def start_cleanup_task(self):
+        """Purga periódica (una vez por ventana) de las IPs inactivas en memoria"""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.get_running_loop().create_task(self._cleanup_loop())
+    
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.window_seconds)
+            self.cleanup_old_entries()
+    
+    async def aclose(self):
+        """Stop the cleanup task and close the Redis connection pool, if any"""
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+        if self._redis is not None:
+            await self._redis.aclose()
 
 
 def get_client_ip(request: Request) -> str:
     """
     Extract client IP from request, considering proxy headers
+    (solo si TRUST_PROXY_HEADERS; una sola pasada sobre los headers crudos)
     
     Args:
         request: FastAPI Request object
@@ -82,16 +232,21 @@ def get_client_ip(request: Request) -> str:
     Returns:
         str: Client IP address
     """
-    # Check X-Forwarded-For header (set by proxies)
-    forwarded_for = request.headers.get("X-Forwarded-For")
-    if forwarded_for:
-        # Take the first IP in the chain
-        return forwarded_for.split(",")[0].strip()
-    
-    # Check X-Real-IP header
-    real_ip = request.headers.get("X-Real-IP")
-    if real_ip:
-        return real_ip
+    if TRUST_PROXY_HEADERS:
+        forwarded_seen = False
+        real_ip = None
+        for key, value in request.scope["headers"]:
+            # X-Forwarded-For (set by proxies) tiene prioridad sobre X-Real-IP
+            if key == _X_FORWARDED_FOR and not forwarded_seen:
+                if value:
+                    # Take the first IP in the chain
+                    return value.split(b",", 1)[0].strip().decode("latin-1")
+                forwarded_seen = True
+            elif key == _X_REAL_IP and real_ip is None:
+                real_ip = value
+        
+        if real_ip:
+            return real_ip.decode("latin-1")
     
     # Fall back to direct client host
     return request.client.host if request.client else "unknown"
@@ -102,7 +257,7 @@ def validate_stroke_points(points: List, min_points: int = 100, max_points: int
     Validate stroke points meet requirements
     
     Args:
-        points: List of stroke points
+        points: Stroke (columnar) or list of stroke points
         min_points: Minimum required points
         max_points: Maximum allowed points
         
@@ -117,26 +272,43 @@ def validate_stroke_points(points: List, min_points: int = 100, max_points: int
     if num_points > max_points:
         return False, f"Too many points: {num_points} > {max_points}"
     
-    # Validate each point has required fields
-    for i, point in enumerate(points):
-        if not hasattr(point, 'x') or not hasattr(point, 'y'):
-            return False, f"Point {i} missing x or y coordinate"
-        if not hasattr(point, 't') or not hasattr(point, 'p'):
-            return False, f"Point {i} missing timestamp or pressure"
-    
+    # Los campos x/y/t/p ya los garantiza pydantic (StrokeArray / StrokePoint)
     return True, ""
 
 
+def _padding_insert_counts(num_points: int, points_to_add: int) -> List[int]:
+    """Cuántos puntos medios se insertan después de cada punto original"""
+    counts = [0] * num_points
+    
+    # Calculate interval for inserting interpolated points
+    interval = num_points / points_to_add if points_to_add > 0 else num_points
+    
+    insert_counter = 0.0
+    points_added = 0
+    
+    for i in range(num_points - 1):
+        if points_added >= points_to_add:
+            break
+        insert_counter += 1.0
+        
+        while insert_counter >= interval and points_added < points_to_add:
+            counts[i] += 1
+            points_added += 1
+            insert_counter -= interval
+    
+    return counts
+
+
 def apply_linear_interpolation_padding(points: List, target_points: int = 100) -> List:
     """
     Apply linear interpolation padding to reach target number of points
     
     Args:
-        points: Original stroke points
+        points: Original stroke points (Stroke columnar or list)
         target_points: Desired number of points
         
     Returns:
-        List: Padded stroke points
+        List: Padded stroke points (a Stroke if the input was a Stroke)
     """
     num_points = len(points)
     
@@ -144,45 +316,51 @@ def apply_linear_interpolation_padding(points: List, target_points: int = 100) -
     if num_points >= target_points:
         return points
     
-    logger.info(f"Applying padding: {num_points} -> {target_points} points")
+    logger.info("Applying padding: %s -> %s points", num_points, target_points)
     
     # Calculate how many points to add
     points_to_add = target_points - num_points
+    counts = _padding_insert_counts(num_points, points_to_add)
     
-    # Create new list with interpolated points
-    padded_points = []
-    
-    # Calculate interval for inserting interpolated points
-    interval = num_points / points_to_add if points_to_add > 0 else num_points
-    
-    insert_counter = 0.0
-    points_added = 0
-    
-    for i in range(num_points):
-        # Add original point
-        padded_points.append(points[i])
+    if isinstance(points, Stroke):
+        # Punto medio entre i e i+1, insertado counts[i] veces tras el original i
+        columns = {}
+        for name in ("x", "y", "t", "p"):
+            col = getattr(points, name)
+            mid = col[:-1] + (col[1:] - col[:-1]) * 0.5
+            if name == "t":
+                mid = mid.astype(col.dtype)
+            columns[name] = col, mid
         
-        # Check if we should insert interpolated point(s)
-        if i < num_points - 1 and points_added < points_to_add:
-            insert_counter += 1.0
+        # Índice sobre concatenate((col, mid)): original i -> i, punto medio i -> n + i
+        repeats = np.asarray(counts, dtype=np.intp) + 1
+        owner = np.repeat(np.arange(num_points), repeats)
+        offset = np.arange(owner.size) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+        source = np.where(offset == 0, owner, owner + num_points)
+        padded_points = Stroke(**{
+            name: np.concatenate((col, mid))[source]
+            for name, (col, mid) in columns.items()
+        })
+    else:
+        padded_points = []
+        for i, count in enumerate(counts):
+            # Add original point
+            padded_points.append(points[i])
             
-            # Insert interpolated point between current and next
-            while insert_counter >= interval and points_added < points_to_add:
-                # Interpolate between points[i] and points[i+1]
-                t = 0.5  # Midpoint interpolation
-                
-                interpolated = type(points[i])(
-                    x=points[i].x + (points[i+1].x - points[i].x) * t,
-                    y=points[i].y + (points[i+1].y - points[i].y) * t,
-                    t=int(points[i].t + (points[i+1].t - points[i].t) * t),
-                    p=points[i].p + (points[i+1].p - points[i].p) * t
+            if count:
+                # Midpoint interpolation between points[i] and points[i+1]
+                current, nxt = points[i], points[i + 1]
+                padded_points.extend(
+                    type(current)(
+                        x=current.x + (nxt.x - current.x) * 0.5,
+                        y=current.y + (nxt.y - current.y) * 0.5,
+                        t=int(current.t + (nxt.t - current.t) * 0.5),
+                        p=current.p + (nxt.p - current.p) * 0.5
+                    )
+                    for _ in range(count)
                 )
-                
-                padded_points.append(interpolated)
-                points_added += 1
-                insert_counter -= interval
     
-    logger.info(f"Padding complete: {len(padded_points)} points")
+    logger.info("Padding complete: %s points", len(padded_points))
     return padded_points
 
 
@@ -192,7 +370,7 @@ def calculate_basic_features(points: List) -> Dict:
     (Fallback if features not provided)
     
     Args:
-        points: List of stroke points
+        points: Stroke (columnar) or list of stroke points
         
     Returns:
         Dict: Calculated features
@@ -206,28 +384,26 @@ def calculate_basic_features(points: List) -> Dict:
             "duration_ms": 0
         }
     
-    total_distance = 0.0
-    velocities = []
+    if isinstance(points, Stroke):
+        x, y, t = points.x, points.y, points.t
+    else:
+        arr = np.fromiter(
+            ((p.x, p.y, p.t) for p in points), dtype=np.dtype((np.float64, 3)), count=len(points)
+        )
+        x, y, t = arr[:, 0], arr[:, 1], arr[:, 2]
     
-    for i in range(len(points) - 1):
-        # Calculate distance
-        dx = points[i+1].x - points[i].x
-        dy = points[i+1].y - points[i].y
-        distance = (dx**2 + dy**2)**0.5
-        total_distance += distance
-        
-        # Calculate velocity
-        dt = points[i+1].t - points[i].t
-        if dt > 0:
-            velocity = distance / dt
-            velocities.append(velocity)
+    # Distancia y velocidad entre puntos consecutivos
+    distances = np.hypot(np.diff(x), np.diff(y))
+    dt = np.diff(t)
+    moving = dt > 0
+    velocities = distances[moving] / dt[moving]
     
-    duration_ms = points[-1].t - points[0].t if len(points) > 0 else 0
+    duration_ms = points[-1].t - points[0].t if not isinstance(points, Stroke) else int(t[-1] - t[0])
     
     return {
         "num_points": len(points),
-        "total_distance": round(total_distance, 2),
-        "velocity_mean": round(sum(velocities) / len(velocities), 2) if velocities else 0.0,
-        "velocity_max": round(max(velocities), 2) if velocities else 0.0,
+        "total_distance": round(float(distances.sum()), 2),
+        "velocity_mean": round(float(velocities.mean()), 2) if velocities.size else 0.0,
+        "velocity_max": round(float(velocities.max()), 2) if velocities.size else 0.0,
         "duration_ms": duration_ms
     }
@@ -49,6 +49,23 @@ if __name__ == '__main__':
 
     uvicorn_reload = os.getenv('UVICORN_RELOAD', 'false').lower() == 'true'
 
+    # Procesos worker (cada uno carga su propia copia del modelo TFLite).
+    # API_WORKERS=auto usa un worker por CPU. reload solo funciona con un
+    # proceso, así que ahí se ignora API_WORKERS
+    api_workers_raw = os.getenv('API_WORKERS', '1').strip().lower()
+    if api_workers_raw == 'auto':
+        api_workers = os.cpu_count() or 1
+    else:
+        api_workers = max(1, int(api_workers_raw))
+    if uvicorn_reload:
+        api_workers = 1
+
+    if api_workers > 1 and not os.getenv('RATE_LIMIT_REDIS_URL'):
+        print(
+            f"WARNING: {api_workers} workers without RATE_LIMIT_REDIS_URL: each worker keeps "
+            "its own rate limit window, so the effective limit is multiplied by the worker count."
+        )
+
     # If TLS is requested, require cert/key to be provided
     if tls_enabled:
         cert_file = require_env('TLS_CERT_FILE')
@@ -65,6 +82,9 @@ if __name__ == '__main__':
             ssl_certfile=cert_file,
             ssl_keyfile=key_file,
             reload=uvicorn_reload,
+            workers=api_workers,
+            loop='auto',
+            http='auto',
             log_level='info'
         )
     else:
@@ -74,5 +94,8 @@ if __name__ == '__main__':
             host=bind_host,
             port=api_port,
             reload=uvicorn_reload,
+            workers=api_workers,
+            loop='auto',
+            http='auto',
             log_level='info'
         )